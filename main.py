@@ -1,41 +1,70 @@
 import os
+import sys
+import atexit
+import queue
 import signal
 import logging
-import time
+import logging.handlers
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from utils.sync_utils import sync_branch, load_connections # db_config is in sync_utils now
-from utils.common import log_print
+from utils.common import log_print, MAX_CONCURRENT_TABLES_PER_BRANCH
+from utils.db_utils import set_pool_max_idle_per_key
 from sync_config import allowed_start_time, allowed_end_time
 
 MAX_DB_SYNC_WORKERS = 4 # Renamed from MAX_WORKERS for clarity
 RUN_INTERVAL_SECONDS = 2000 
 ALLOWED_WINDOW_CHECK_INTERVAL_SECONDS = 60
 
-# Global mutable state for controlling the main loop and threads
-running_state = {'is_running': True}
+# Set by the signal handler; the main loop and worker threads wait on / check it for shutdown
+shutdown_event = threading.Event()
+
+# Parse the allowed sync window once at import; it is checked on every loop iteration
+try:
+    _ALLOWED_START_TIME = datetime.strptime(allowed_start_time, "%H:%M").time()
+    _ALLOWED_END_TIME = datetime.strptime(allowed_end_time, "%H:%M").time()
+    _ALLOWED_WINDOW_PARSE_ERROR = None
+except ValueError as e:
+    _ALLOWED_START_TIME = _ALLOWED_END_TIME = None
+    _ALLOWED_WINDOW_PARSE_ERROR = e
+
+def _start_queue_listener(*handlers: logging.Handler) -> logging.handlers.QueueHandler:
+    """
+    Returns a QueueHandler whose records are written to the given handlers by a background listener thread,
+    so worker threads only enqueue records instead of blocking on file/console writes.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s")) # Real formatting happens in the target handlers
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Drains remaining records on interpreter exit
+    return queue_handler
+
 
 def setup_logging():
     """Configures logging for the application."""
     log_dir = "log"
     os.makedirs(log_dir, exist_ok=True)
 
+    root_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(threadName)s - %(message)s") # Added threadName
+    sync_handler = logging.FileHandler(os.path.join(log_dir, "sync.log"), encoding='utf-8')
+    sync_handler.setFormatter(root_formatter)
+    console_handler = logging.StreamHandler(sys.stdout) # Also log to console (flushed after every record)
+    console_handler.setFormatter(root_formatter)
+
     logging.basicConfig(
         level=logging.INFO, 
-        format="%(asctime)s - %(levelname)s - %(name)s - %(threadName)s - %(message)s", # Added threadName
-        encoding='utf-8',
-        handlers=[
-            logging.FileHandler(os.path.join(log_dir, "sync.log"), encoding='utf-8'),
-            logging.StreamHandler() # Also log to console
-        ]
+        handlers=[_start_queue_listener(sync_handler, console_handler)]
     )
 
     # Configure specific logger for successful operations
     success_logger = logging.getLogger("success")
     success_handler = logging.FileHandler(os.path.join(log_dir, "success.log"), encoding='utf-8')
     success_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
-    success_logger.addHandler(success_handler)
+    success_logger.addHandler(_start_queue_listener(success_handler))
     success_logger.setLevel(logging.INFO)
     success_logger.propagate = False # Avoid duplicate messages in root logger's sync.log
 
@@ -43,7 +72,7 @@ def setup_logging():
     error_logger = logging.getLogger("errors")
     error_handler = logging.FileHandler(os.path.join(log_dir, "errors.log"), encoding='utf-8')
     error_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(threadName)s - %(message)s")) # Added threadName
-    error_logger.addHandler(error_handler)
+    error_logger.addHandler(_start_queue_listener(error_handler))
     error_logger.setLevel(logging.ERROR) 
     error_logger.propagate = False # Avoid duplicate messages in root logger's sync.log
 
@@ -54,33 +83,47 @@ def setup_logging():
 
 def handle_exit(signum, frame):
     """Signal handler for graceful shutdown."""
-    global running_state # Use the shared mutable state
-    if running_state['is_running']: 
+    if not shutdown_event.is_set(): 
         log_print(f"🛑 Signal {signal.Signals(signum).name} received. Gracefully shutting down after current tasks...", level="warning")
-        running_state['is_running'] = False
+        shutdown_event.set()
     else:
         log_print(f"🛑 Shutdown already in progress. Signal {signal.Signals(signum).name} received again.", level="warning")
 
 
 def in_allowed_sync_window():
     """Checks if the current time is within the allowed synchronization window."""
-    try:
-        now_time = datetime.now().time()
-        start_time_obj = datetime.strptime(allowed_start_time, "%H:%M").time()
-        end_time_obj = datetime.strptime(allowed_end_time, "%H:%M").time()
-
-        if start_time_obj == end_time_obj: 
-            return True
-        if start_time_obj < end_time_obj: 
-            return start_time_obj <= now_time < end_time_obj
-        else: 
-            return now_time >= start_time_obj or now_time < end_time_obj
-    except ValueError as e:
-        log_print(f"Error parsing allowed_start_time/allowed_end_time from sync_config.py: {e}. Defaulting to allowing sync.", level="error")
+    if _ALLOWED_WINDOW_PARSE_ERROR is not None:
+        log_print(f"Error parsing allowed_start_time/allowed_end_time from sync_config.py: {_ALLOWED_WINDOW_PARSE_ERROR}. Defaulting to allowing sync.", level="error")
+        return True
+
+    now_time = datetime.now().time()
+    start_time_obj = _ALLOWED_START_TIME
+    end_time_obj = _ALLOWED_END_TIME
+
+    if start_time_obj == end_time_obj: 
         return True
+    if start_time_obj < end_time_obj: 
+        return start_time_obj <= now_time < end_time_obj
+    else: 
+        return now_time >= start_time_obj or now_time < end_time_obj
+
 
+def sync_source_partition(partition: list[dict], target_config: dict, shutdown_event: threading.Event):
+    """Syncs each source in one worker's partition in turn; no queue is shared with other workers."""
+    for src_cfg in partition:
+        if shutdown_event.is_set():
+            log_print("Shutdown signal received, skipping remaining sources in this worker's partition.", level="warning")
+            return
+        src_server = src_cfg.get('server', 'UnknownServer')
+        try:
+            sync_branch(src_cfg, target_config, shutdown_event)
+            log_print(f"Branch sync completed for source: {src_server}", level="info")
+        except Exception as exc:
+            log_print(f"Branch sync for source {src_server} generated an exception: {exc}", level="error")
+            logging.exception(f"Traceback for {src_server} exception:") # Log full traceback
 
-def main_sync_cycle(current_running_state: dict): # Accept running_state
+
+def main_sync_cycle(shutdown_event: threading.Event):
     """Performs one full cycle of syncing all source branches."""
     log_print("🚀 Starting new DBSync cycle...", level="info")
     try:
@@ -102,29 +145,26 @@ def main_sync_cycle(current_running_state: dict): # Accept running_state
         # db_config is now also in sync_utils, but target_server_config is used directly by sync_branch
         # target_server_params = db_config(target_config) # Not needed if passing full target_config
 
-        with ThreadPoolExecutor(max_workers=MAX_DB_SYNC_WORKERS) as executor:
-            future_to_src = {
-                # Pass current_running_state to sync_branch
-                executor.submit(sync_branch, src_cfg, target_config, current_running_state): src_cfg.get('server', 'UnknownServer')
-                for src_cfg in source_configs
-            }
+        # Round-robin the sources into one partition per worker; each worker drains only its own list
+        worker_count = min(MAX_DB_SYNC_WORKERS, len(source_configs))
+        partitions = [source_configs[i::worker_count] for i in range(worker_count)]
+        # At most this many target connections are in use at once; keep that many warm between cycles
+        set_pool_max_idle_per_key(worker_count * MAX_CONCURRENT_TABLES_PER_BRANCH)
+
+        with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="source_worker") as executor:
+            futures = [
+                executor.submit(sync_source_partition, partition, target_config, shutdown_event)
+                for partition in partitions
+            ]
 
-            for future in as_completed(future_to_src):
-                src_server = future_to_src[future]
+            for future in as_completed(futures):
                 try:
-                    future.result() 
-                    log_print(f"Branch sync completed for source: {src_server}", level="info")
+                    future.result() # Per-source errors are already handled inside sync_source_partition
                 except Exception as exc:
-                    log_print(f"Branch sync for source {src_server} generated an exception: {exc}", level="error")
-                    logging.exception(f"Traceback for {src_server} exception:") # Log full traceback
-                if not current_running_state['is_running']: # Check shared state
-                    log_print("Shutdown signal received, attempting to cancel pending tasks.", level="warning")
-                    # Cancel futures that haven't started
-                    for f in future_to_src:
-                        if not f.done():
-                            f.cancel()
-                    # Note: Tasks already running will complete unless they internally check running_state
-                    break 
+                    log_print(f"Source worker generated an unexpected exception: {exc}", level="error")
+                    logging.exception("Traceback for source worker exception:")
+                # Note: Workers stop picking up new sources once shutdown_event is set; running syncs finish
+                # unless they internally check shutdown_event
         
         log_print("✅ DBSync cycle completed.", level="success")
 
@@ -143,23 +183,17 @@ if __name__ == "__main__":
 
     log_print("🚀 DBSync Script Started. Press Ctrl+C to initiate graceful shutdown.", level="info")
 
-    while running_state['is_running']: # Check shared state
+    while not shutdown_event.is_set():
         if not in_allowed_sync_window():
             log_print(f"🕒 Outside allowed sync window ({allowed_start_time}-{allowed_end_time}). Waiting for {ALLOWED_WINDOW_CHECK_INTERVAL_SECONDS}s...", level="info")
             
-            for _ in range(ALLOWED_WINDOW_CHECK_INTERVAL_SECONDS // 5): 
-                if not running_state['is_running']: break # Check shared state
-                time.sleep(20000)
-            if not running_state['is_running']: break
+            if shutdown_event.wait(ALLOWED_WINDOW_CHECK_INTERVAL_SECONDS): break # Returns early on shutdown
             continue
 
-        main_sync_cycle(running_state) # Pass shared state
+        main_sync_cycle(shutdown_event)
 
-        if running_state['is_running']: 
-            log_print(f"⏳ Waiting {RUN_INTERVAL_SECONDS} seconds before next cycle...", level="info")
-            for _ in range(RUN_INTERVAL_SECONDS):
-                if not running_state['is_running']: break # Check shared state
-                time.sleep(1)
-        if not running_state['is_running']: break 
+        if shutdown_event.is_set(): break
+        log_print(f"⏳ Waiting {RUN_INTERVAL_SECONDS} seconds before next cycle...", level="info")
+        if shutdown_event.wait(RUN_INTERVAL_SECONDS): break # Returns early on shutdown
 
     log_print("✅ DBSync Script has shut down gracefully.", level="info")
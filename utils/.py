@@ -1,5 +1,8 @@
+import asyncio
+import numpy as np
 import pandas as pd
 import openai
+import httpx
 import os
 import json
 from tqdm import tqdm
@@ -20,10 +23,19 @@ TARGET_COLUMNS = [
     'AiBrand', 'AiCompany', 'AiDepartment', 'AiCategory', 'AiSubCategory', 
     'AiCoreCategory', 'AiVariant', 'AiWeightPcs', 'AiUom', 'AiDescription', 'AiShortDescription'
 ]
+# Maps each target column to the key the AI returns for it in its JSON response
+AI_RESULT_FIELDS = {
+    'AiBrand': 'brand', 'AiCompany': 'company', 'AiDepartment': 'department',
+    'AiCategory': 'category', 'AiSubCategory': 'subcategory', 'AiCoreCategory': 'core_category',
+    'AiVariant': 'variant', 'AiWeightPcs': 'weight_pcs', 'AiUom': 'uom',
+    'AiDescription': 'new_description', 'AiShortDescription': 'short_description'
+}
 
 # --- Script & API Configuration ---
 BATCH_SIZE = 10
 OPENAI_MODEL = "gpt-4o-mini" 
+MAX_CONCURRENT_AI = 8 # Caps in-flight OpenAI requests per batch to limit rate-limit pressure
+OPENAI_TIMEOUT_SECONDS = 60
 PDF_GUIDE_FILE = 'categories explained.pdf'
 
 # --- 2. Database Manager Class ---
@@ -43,6 +55,8 @@ class DatabaseManager:
         try:
             self.cnxn = pyodbc.connect(self.conn_str)
             self.cursor = self.cnxn.cursor()
+            self.cursor.fast_executemany = True
+            self.cursor.arraysize = BATCH_SIZE
             print("✅ Database connection successful.")
         except Exception as e:
             print(f"❌ Database connection failed: {e}")
@@ -90,28 +104,33 @@ class DatabaseManager:
             )
             SELECT TOP {BATCH_SIZE} * FROM ConsolidatedDescriptions
         """
-        return pd.read_sql(query, self.cnxn)
+        # Small batches are returned as pyodbc Rows (attribute access by column name); no DataFrame needed
+        self.cursor.execute(query)
+        return self.cursor.fetchmany(BATCH_SIZE)
 
     def write_cleaned_data(self, df_results):
-        for index, row in df_results.iterrows():
-            item_code = row[DB_PRIMARY_KEY]
-            # Use MERGE for a robust insert/update operation
-            merge_sql = f"""
-            MERGE {DB_TABLE_DESTINATION} AS target
-            USING (SELECT ? AS {DB_PRIMARY_KEY}) AS source
-            ON (target.{DB_PRIMARY_KEY} = source.{DB_PRIMARY_KEY})
-            WHEN MATCHED THEN
-                UPDATE SET {', '.join([f'{col} = ?' for col in TARGET_COLUMNS])}
-            WHEN NOT MATCHED THEN
-                INSERT ({DB_PRIMARY_KEY}, OriginalDescription_Consolidated, {', '.join(TARGET_COLUMNS)})
-                VALUES (?, ?, {', '.join(['?'] * len(TARGET_COLUMNS))});
-            """
-            
-            update_values = [row.get(c) for c in TARGET_COLUMNS]
-            insert_values = [item_code, row.get('OriginalDescription_Consolidated')] + update_values
-            
-            params = update_values + insert_values
-            self.cursor.execute(merge_sql, params)
+        # One MERGE statement, executed for the whole batch in a single executemany round-trip
+        merge_sql = f"""
+        MERGE {DB_TABLE_DESTINATION} AS target
+        USING (SELECT ? AS {DB_PRIMARY_KEY}) AS source
+        ON (target.{DB_PRIMARY_KEY} = source.{DB_PRIMARY_KEY})
+        WHEN MATCHED THEN
+            UPDATE SET {', '.join([f'{col} = ?' for col in TARGET_COLUMNS])}
+        WHEN NOT MATCHED THEN
+            INSERT ({DB_PRIMARY_KEY}, OriginalDescription_Consolidated, {', '.join(TARGET_COLUMNS)})
+            VALUES (?, ?, {', '.join(['?'] * len(TARGET_COLUMNS))});
+        """
+
+        write_cols = [DB_PRIMARY_KEY, 'OriginalDescription_Consolidated'] + TARGET_COLUMNS
+        df_write = df_results.reindex(columns=write_cols).astype(object)
+        df_write = df_write.where(pd.notna(df_write), None)
+
+        params_list = []
+        for item_code, original_desc, *update_values in df_write.itertuples(index=False, name=None):
+            params_list.append((item_code, *update_values, item_code, original_desc, *update_values))
+
+        if params_list:
+            self.cursor.executemany(merge_sql, params_list)
         self.cnxn.commit()
 
     def close(self):
@@ -120,21 +139,28 @@ class DatabaseManager:
 
 # --- 3. AI Processor Class ---
 class AIProcessor:
+    # Per-item user prompt pieces; create_prompt only splices brand/description between them
+    _USER_PROMPT_HEAD = "<product_data>\n  <brand>"
+    _USER_PROMPT_MID = "</brand>\n  <description>"
+    _USER_PROMPT_TAIL = "</description>\n</product_data>\n\nGenerate the complete JSON object now."
+
     def __init__(self, api_key, category_guide):
-        openai.api_key = api_key
+        # One client (and one keep-alive connection pool) for the whole session, sized to the request concurrency
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                timeout=OPENAI_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_keepalive_connections=MAX_CONCURRENT_AI, max_connections=MAX_CONCURRENT_AI)
+            )
+        )
         self.category_guide = category_guide
         self.dynamic_examples = []
 
-    def add_dynamic_example(self, original_desc, corrected_json):
-        self.dynamic_examples.extend([
-            {"role": "user", "content": f"<product_data><description>{original_desc}</description></product_data>"},
-            {"role": "assistant", "content": json.dumps(corrected_json)}
-        ])
-        print("🧠 AI training example added for this session.")
-
-    def create_prompt(self, brand, description):
-        system_prompt = "You are a highly structured data extraction engine..."
-        user_prompt = (
+        # Everything static (instructions, rules, guide) lives in the system message so the request prefix is
+        # byte-identical across calls and eligible for OpenAI's automatic prompt caching; only the tail varies.
+        # It is built once here rather than per row.
+        self._system_prompt = (
+            "You are a highly structured data extraction engine...\n\n"
             "<task_instructions>...\n"
             "<rules>\n"
             "  1.  **CRITICAL CLASSIFICATION RULE:** For 'department', 'category', 'subcategory', and 'core_category', you MUST select values **directly and exclusively** from the provided `<guide>`.\n"
@@ -147,23 +173,31 @@ class AIProcessor:
             "</rules>\n\n"
             "<guide>\n"
             f"{self.category_guide}\n"
-            "</guide>\n\n"
-            "<product_data>\n"
-            f"  <brand>{brand}</brand>\n"
-            f"  <description>{description}</description>\n"
-            "</product_data>\n\n"
-            "Generate the complete JSON object now."
+            "</guide>"
         )
-        return system_prompt, user_prompt
 
-    def process_data_row(self, brand, description):
+    async def close(self):
+        await self.client.close()
+
+    def add_dynamic_example(self, original_desc, corrected_json):
+        self.dynamic_examples.extend([
+            {"role": "user", "content": f"<product_data><description>{original_desc}</description></product_data>"},
+            {"role": "assistant", "content": json.dumps(corrected_json)}
+        ])
+        print("🧠 AI training example added for this session.")
+
+    def create_prompt(self, brand, description):
+        user_prompt = self._USER_PROMPT_HEAD + str(brand) + self._USER_PROMPT_MID + str(description) + self._USER_PROMPT_TAIL
+        return self._system_prompt, user_prompt
+
+    async def process_data_row(self, brand, description):
         if not description or pd.isna(description): return None
         try:
             system_prompt, user_prompt = self.create_prompt(brand, description)
             messages = [{"role": "system", "content": system_prompt}] + self.dynamic_examples + [{"role": "user", "content": user_prompt}]
             
             tqdm.write(f"Sending request for '{description[:60]}...'")
-            response = openai.chat.completions.create(model=OPENAI_MODEL, messages=messages, response_format={"type": "json_object"}, temperature=0.1)
+            response = await self.client.chat.completions.create(model=OPENAI_MODEL, messages=messages, response_format={"type": "json_object"}, temperature=0.1)
             
             result_json = response.choices[0].message.content
             tqdm.write(f"  -> Response received: {result_json}")
@@ -178,30 +212,46 @@ class InteractiveDataCleaner:
         self.db = db_manager
         self.ai = ai_processor
 
+    async def _process_batch_async(self, batch_rows):
+        # Submit every row of the batch at once and collect results in input order
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_AI)
+
+        async def bounded_process(brand, description):
+            async with semaphore:
+                return await self.ai.process_data_row(brand, description)
+
+        return await asyncio.gather(*[
+            bounded_process(row.Brand, row.ConsolidatedDescription)
+            for row in batch_rows
+        ])
+
     def run(self):
+        # One event loop for the whole session so the async HTTP client's connections are reused across batches
+        with asyncio.Runner() as runner:
+            try:
+                self._run_batches(runner)
+            finally:
+                runner.run(self.ai.close())
+
+    def _run_batches(self, runner):
         while True:
-            batch_df = self.db.fetch_unprocessed_items()
-            if batch_df.empty:
+            batch_rows = self.db.fetch_unprocessed_items()
+            if not batch_rows:
                 print("🎉 All items have been processed. Exiting.")
                 break
 
-            results = []
-            for index, row in batch_df.iterrows():
-                ai_result = self.ai.process_data_row(row['Brand'], row['ConsolidatedDescription'])
-                
-                result_row = {DB_PRIMARY_KEY: row[DB_PRIMARY_KEY], 'OriginalDescription_Consolidated': row['ConsolidatedDescription']}
-                if ai_result:
-                    result_row.update({
-                        'AiBrand': ai_result.get('brand'), 'AiCompany': ai_result.get('company'),
-                        'AiDepartment': ai_result.get('department'), 'AiCategory': ai_result.get('category'),
-                        'AiSubCategory': ai_result.get('subcategory'), 'AiCoreCategory': ai_result.get('core_category'),
-                        'AiVariant': ai_result.get('variant'), 'AiWeightPcs': ai_result.get('weight_pcs'),
-                        'AiUom': ai_result.get('uom'), 'AiDescription': ai_result.get('new_description'),
-                        'AiShortDescription': ai_result.get('short_description')
-                    })
-                results.append(result_row)
+            ai_results = runner.run(self._process_batch_async(batch_rows))
+
+            # Build the result columns directly and construct the DataFrame once
+            result_columns = {DB_PRIMARY_KEY: [], 'OriginalDescription_Consolidated': []}
+            result_columns.update({col: [] for col in TARGET_COLUMNS})
+            for row, ai_result in zip(batch_rows, ai_results):
+                result_columns[DB_PRIMARY_KEY].append(getattr(row, DB_PRIMARY_KEY))
+                result_columns['OriginalDescription_Consolidated'].append(row.ConsolidatedDescription)
+                for col, ai_key in AI_RESULT_FIELDS.items():
+                    result_columns[col].append(ai_result.get(ai_key) if ai_result else None)
             
-            results_df = pd.DataFrame(results)
+            results_df = pd.DataFrame(result_columns)
             
             while True:
                 print("\n--- AI Processing Results ---")
@@ -224,17 +274,18 @@ class InteractiveDataCleaner:
     def handle_correction(self, results_df):
         try:
             item_to_correct = input("Enter the ItemCode of the row to correct: ")
-            row_index = results_df.index[results_df[DB_PRIMARY_KEY] == item_to_correct].tolist()[0]
+            row_index = results_df.index[np.flatnonzero(results_df[DB_PRIMARY_KEY].to_numpy() == item_to_correct)[0]]
             
             original_description = results_df.at[row_index, 'OriginalDescription_Consolidated']
+            current_values = results_df.loc[row_index, TARGET_COLUMNS].tolist()
             corrected_data = {}
 
             print("\nEnter the correct value for each field. Press Enter to accept the current value.")
-            for col in TARGET_COLUMNS:
-                current_val = results_df.at[row_index, col]
+            for col, current_val in zip(TARGET_COLUMNS, current_values):
                 new_val = input(f"  {col} (current: {current_val}): ")
                 corrected_data[col] = new_val if new_val else current_val
-                results_df.at[row_index, col] = corrected_data[col]
+            # Write all corrected fields back in one assignment
+            results_df.loc[row_index, TARGET_COLUMNS] = [corrected_data[col] for col in TARGET_COLUMNS]
             
             ai_training_json = {k.replace('Ai', '').lower(): v for k, v in corrected_data.items()}
             ai_training_json['new_description'] = corrected_data['AiDescription']
@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 # --- Configuration Constants ---
 
@@ -9,6 +10,24 @@ CONSOLIDATED_TARGET_DATABASE = "ConsolidatedDB"
 SYNC_LOOKBACK_DAYS = 0
 DEFAULT_BATCH_SIZE = 100
 MAX_CONCURRENT_TABLES_PER_BRANCH = 2 
+# Run a branch's tables in worker processes instead of threads, for when row serialization keeps the sync
+# process CPU-bound (GIL contention). Workers log to the console only and keep their own connection pools.
+TABLE_SYNC_USE_PROCESSES = False
+FETCH_CHUNK_SIZE = 5000 # Rows per fetchmany() when streaming a batch from source into the staging table
+
+# Optional BULK INSERT staging for large chunks. Needs a directory this process can write to that the TARGET
+# SQL Server service can also read (e.g. a share), given as seen from each side, plus ADMINISTER BULK OPERATIONS.
+# Leave BULK_INSERT_CLIENT_DIR as None to always stage with fast_executemany.
+BULK_INSERT_CLIENT_DIR = None  # e.g. r"\\fileserver\sync_stage"
+BULK_INSERT_SERVER_DIR = None  # Same directory as the SQL Server service sees it; defaults to BULK_INSERT_CLIENT_DIR
+BULK_INSERT_MIN_ROWS = 2000    # Smaller chunks are staged with fast_executemany (file setup would dominate)
+
+# Adaptive batch sizing for incremental syncs: starting from BATCH_SIZE_MAP, each table's batch size is scaled
+# after every batch so a batch (fetch + stage + upsert) takes about ADAPTIVE_BATCH_TARGET_SECONDS.
+ADAPTIVE_BATCH_TARGET_SECONDS = 5.0
+ADAPTIVE_BATCH_MIN_SIZE = 100
+ADAPTIVE_BATCH_MAX_SIZE = 200000
+ADAPTIVE_BATCH_MAX_GROWTH = 2.0 # Grow by at most this factor per batch; shrinking is immediate
 
 BATCH_SIZE_MAP = {
     'saledetail': 100,
@@ -18,7 +37,7 @@ BATCH_SIZE_MAP = {
     'Supplier': 100,
     'logo': 100,
     'tbl_ChartofAccount': 110,
-'SubCategory':'110'
+    'SubCategory': 110
 }
 
 SYNC_METHODS = {
@@ -37,6 +56,10 @@ SYNC_METHODS = {
     'SubCategory':'Autono'
 }
 
+# Lookups are by lowercased table name; normalize keys (and batch sizes to int) once at import
+BATCH_SIZE_MAP = {k.lower(): int(v) for k, v in BATCH_SIZE_MAP.items()}
+SYNC_METHODS = {k.lower(): v for k, v in SYNC_METHODS.items()}
+
 TABLES_TO_SYNC = [
     'SALEDETAIL',
     'SALEHEADER',
@@ -61,73 +84,104 @@ TABLES_TO_SYNC = [
 OVERRIDE_PK_COL = {}
 DIAGNOSTIC_SUPPORT_ENABLED = True
 
-# --- Logging Function (No changes) ---
+# --- Logging Function ---
+_LEVEL_FUNCS = {
+    "error": logging.error,
+    "warning": logging.warning,
+    "debug": logging.debug,
+    "critical": logging.critical,
+    "info": logging.info,
+    "success": logging.info,
+}
+_SUCCESS_LOGGER = logging.getLogger("success")
+_ERROR_LOGGER = logging.getLogger("errors")
+
 def log_print(msg, level="info"):
-    print(msg, flush=True)
-    if level == "error":
-        logging.error(msg)
-    elif level == "warning":
-        logging.warning(msg)
-    elif level == "debug":
-        logging.debug(msg)
-    elif level == "critical":
-        logging.critical(msg)
-    else:
-        logging.info(msg)
+    # Console output comes from the root logger's stdout StreamHandler (see main.setup_logging)
+    _LEVEL_FUNCS.get(level, logging.info)(msg)
     
     if level == "success":
-        success_logger = logging.getLogger("success")
-        success_logger.info(msg)
+        _SUCCESS_LOGGER.info(msg)
     elif level == "error" or level == "critical":
-        error_logger = logging.getLogger("errors")
-        error_logger.error(msg)
+        _ERROR_LOGGER.error(msg)
+
+
+# --- Query Building Function ---
+_WATERMARK_FILTER_METHODS = frozenset({'autono', 'hybrid'})
+_TIMESTAMP_FILTER_METHODS = frozenset({'timestamp', 'hybrid'})
+_DATE_WATERMARK_COLUMNS = frozenset({'TrnDate', 'VoucherDate'})
+_SALE_TABLES = frozenset({'saledetail', 'saleheader'})
+
+@lru_cache(maxsize=128)
+def _select_columns_sql(select_columns: tuple[str, ...]) -> str:
+    """Bracketed, comma-separated column list; cached since a table's columns are fixed between calls."""
+    return ", ".join(f"[{col}]" for col in select_columns)
+
+
+def _select_sql(select_columns_str: str, table_name: str, watermark_column: str, where_clause: str | None = None) -> str:
+    """Assembles the batch SELECT in a single join rather than chained f-strings. The row count is the first parameter."""
+    parts = ["SELECT TOP (?) ", select_columns_str, " FROM [", table_name, "]"]
+    if where_clause:
+        parts += [" WHERE ", where_clause]
+    parts += [" ORDER BY [", watermark_column, "]"]
+    return "".join(parts)
 
 
-# --- Query Building Function (No changes) ---
 def build_query(
     table_name: str,
     select_columns: list[str],
     watermark_column: str,
     last_synced_value: str,
-    sync_method: str | None = None
-    ) -> str:
+    sync_method: str | None = None,
+    batch_size: int | None = None
+    ) -> tuple[str, list]:
+    """
+    Builds the batch SELECT for a table. Returns (sql, params); the row count (batch_size, or the table's
+    BATCH_SIZE_MAP entry if None) and filter values are bound as parameters so SQL Server can reuse one
+    cached plan across watermarks and batch sizes.
+    """
     if not select_columns:
         log_print(f"Warning: No columns specified for SELECT in build_query for table '{table_name}'. Defaulting to SELECT *.", level="warning")
         select_columns_str = "*"
     else:
-        select_columns_str = ", ".join([f"[{col}]" for col in select_columns])
+        select_columns_str = _select_columns_sql(tuple(select_columns))
 
-    batch_size = BATCH_SIZE_MAP.get(table_name.lower(), DEFAULT_BATCH_SIZE)
+    table_key = table_name.lower()
+    if batch_size is None:
+        batch_size = BATCH_SIZE_MAP.get(table_key, DEFAULT_BATCH_SIZE)
     
     if sync_method is None:
-        sync_method = SYNC_METHODS.get(table_name.lower(), 'autono')
+        sync_method = SYNC_METHODS.get(table_key, 'autono')
 
     if sync_method == 'full':
-        return f"SELECT TOP {batch_size} {select_columns_str} FROM [{table_name}] ORDER BY [{watermark_column}]"
+        return _select_sql(select_columns_str, table_name, watermark_column), [batch_size]
 
     conditions = []
+    params = [batch_size]
     current_time_cutoff_str = (datetime.now() - timedelta(days=SYNC_LOOKBACK_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
 
-    if sync_method in ('autono', 'hybrid') or watermark_column not in ('TrnDate', 'VoucherDate'):
-        conditions.append(f"[{watermark_column}] > '{last_synced_value}'")
+    if sync_method in _WATERMARK_FILTER_METHODS or watermark_column not in _DATE_WATERMARK_COLUMNS:
+        conditions.append(f"[{watermark_column}] > ?")
+        params.append(last_synced_value)
 
-    if sync_method in ('timestamp', 'hybrid'):
+    if sync_method in _TIMESTAMP_FILTER_METHODS:
         timestamp_col_for_condition = None
-        if table_name.lower() in ('saledetail', 'saleheader') and 'TrnDate' in select_columns:
+        if table_key in _SALE_TABLES and 'TrnDate' in select_columns:
             timestamp_col_for_condition = 'TrnDate'
-        elif table_name.lower() == 'debitheader' and 'VoucherDate' in select_columns:
+        elif table_key == 'debitheader' and 'VoucherDate' in select_columns:
             timestamp_col_for_condition = 'VoucherDate'
-        elif watermark_column in select_columns and SYNC_METHODS.get(table_name.lower()) == 'timestamp':
+        elif watermark_column in select_columns and SYNC_METHODS.get(table_key) == 'timestamp':
             timestamp_col_for_condition = watermark_column
 
         if timestamp_col_for_condition:
-            conditions.append(f"[{timestamp_col_for_condition}] >= '{current_time_cutoff_str}'")
+            conditions.append(f"[{timestamp_col_for_condition}] >= ?")
+            params.append(current_time_cutoff_str)
         else:
             log_print(f"Warning: Timestamp column for 'timestamp'/'hybrid' sync method not identified for table '{table_name}'.", level="warning")
 
     if not conditions:
         log_print(f"Warning: No WHERE conditions for incremental sync of table '{table_name}'. Fetching from beginning.", level="warning")
-        return f"SELECT TOP {batch_size} {select_columns_str} FROM [{table_name}] ORDER BY [{watermark_column}]"
+        return _select_sql(select_columns_str, table_name, watermark_column), [batch_size]
 
     where_clause = ' AND '.join(conditions)
-    return f"SELECT TOP {batch_size} {select_columns_str} FROM [{table_name}] WHERE {where_clause} ORDER BY [{watermark_column}]"
+    return _select_sql(select_columns_str, table_name, watermark_column, where_clause), params
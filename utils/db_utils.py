@@ -1,21 +1,133 @@
 # --- utils/db_utils.py ---
 
 import pyodbc
+import hashlib
+import json
 import logging # Assuming logging is configured in main script
+import pickle
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, wraps
 from utils.common import log_print # Assuming log_print is in common.py
 from datetime import datetime # For Python-side timestamping if needed
 
+SQL_SERVER_MAX_PARAMS = 2000   # SQL Server allows 2100 parameters per statement; keep headroom
+SQL_SERVER_MAX_VALUES_ROWS = 1000 # Row limit of a single table value constructor (VALUES ...)
+
+# Pooling is done in Python (see acquire_connection); ODBC driver-manager pooling is disabled
+# because it does not validate or evict connections reliably when driven from Python.
+pyodbc.pooling = False
+
+POOL_MAX_IDLE_SECONDS = 300      # Idle pooled connections older than this are closed instead of reused
+POOL_VALIDATE_AFTER_SECONDS = 30 # Idle pooled connections older than this get a 'SELECT 1' check before reuse
+POOL_MAX_IDLE_PER_KEY = 16       # Idle connections kept per pool key; extras are closed on release (see set_pool_max_idle_per_key)
+
+_POOL: dict[tuple, list[tuple[pyodbc.Connection, float]]] = {} # key -> [(idle connection, released_at)]
+_CHECKED_OUT: dict[int, tuple] = {} # id(connection) -> pool key
+_POOL_LOCK = threading.Lock()
+
+SCHEMA_CACHE_MAX_ENTRIES = 4096
+SCHEMA_CACHE_TTL_SECONDS = 600 # Bounds how long an out-of-band schema change on a source can go unnoticed
+
+# (server, database, schema, table) -> (fetched_at, schema details); LRU ordered
+_SCHEMA_CACHE: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+_SCHEMA_CACHE_LOCK = threading.Lock()
+
+# Second-level schema cache on disk, so a restarted process (e.g. run from cron) does not start cold.
+# Entries carry the table's sys.objects.modify_date (bumped by any ALTER TABLE) and are used only while it still
+# matches, which costs one small catalog query instead of the full column/PK read; set the path to None to disable.
+SCHEMA_DISK_CACHE_PATH = "schema_cache.sqlite3"
+_SCHEMA_DISK_CACHE: sqlite3.Connection | None = None
+_SCHEMA_DISK_CACHE_LOCK = threading.Lock()
+
+# Per-connection cursors dedicated to one SQL text each (see exec_cached); LRU ordered, at most
+# STMT_CURSORS_MAX_PER_CONN per connection (chunked statements produce one text per chunk size)
+STMT_CURSORS_MAX_PER_CONN = 32
+_STMT_CURSORS: dict[int, tuple[pyodbc.Connection, OrderedDict[str, pyodbc.Cursor]]] = {}
+_STMT_CURSORS_LOCK = threading.Lock()
+
+# One-time setup already done by this process: ensure_database_exists by (server, port, database) and
+# ensure_sync_schema_and_meta by (server, database). Out-of-band drops are not noticed until restart.
+_DATABASES_ENSURED: set[tuple[str, str, str]] = set()
+_SYNC_META_READY: set[tuple[str, str]] = set()
+_SETUP_LOCK = threading.Lock()
+
+# --- Parameter types matching the SyncMeta DDL, bound explicitly so SQL Server sees one parameter
+# signature (and caches one plan) per statement regardless of the string lengths passed in ---
+_META_NAME_PARAM = (pyodbc.SQL_WVARCHAR, 255, 0)    # BranchName / TableName / LastValue NVARCHAR(255)
+_META_STATUS_PARAM = (pyodbc.SQL_WVARCHAR, 20, 0)   # SyncStatus NVARCHAR(20)
+_META_REMARKS_PARAM = (pyodbc.SQL_WLONGVARCHAR, 0, 0) # SyncRemarks NVARCHAR(MAX)
+_META_HASH_PARAM = (pyodbc.SQL_WVARCHAR, 64, 0)     # SourceSchemaHash NVARCHAR(64)
+
+# --- Hot SyncMeta statements (constant text so exec_cached can keep them prepared) ---
+# Create-if-missing. UPDLOCK + HOLDLOCK keep the key range locked between the existence check and the insert, so a
+# row created concurrently (another worker or instance) is skipped instead of failing the batch on the primary key.
+_SQL_INSERT_META = """
+    INSERT INTO [sync].[SyncMeta] (BranchName, TableName, LastValue, SyncStatus, LastSynced)
+    SELECT S.BranchName, S.TableName, S.LastValue, S.SyncStatus, GETDATE()
+    FROM (SELECT ? AS BranchName, ? AS TableName, ? AS LastValue, ? AS SyncStatus) AS S
+    WHERE NOT EXISTS (
+        SELECT 1 FROM [sync].[SyncMeta] AS T WITH (UPDLOCK, HOLDLOCK)
+        WHERE T.BranchName = S.BranchName AND T.TableName = S.TableName
+    )
+"""
+_SYSNAME_PARAM = (pyodbc.SQL_WVARCHAR, 128, 0) # SYSNAME is NVARCHAR(128)
+_SQL_DATABASE_EXISTS = "SELECT name FROM sys.databases WHERE name = ?"
+# Quoting is done server-side; the statement text is the same for every database name
+_SQL_CREATE_DATABASE = "DECLARE @n SYSNAME = ?; DECLARE @sql NVARCHAR(MAX) = N'CREATE DATABASE ' + QUOTENAME(@n); EXEC sp_executesql @sql;"
+_SQL_GET_SCHEMA_HASH = "SELECT SourceSchemaHash FROM [sync].[SyncMeta] WHERE BranchName = ? AND TableName = ?"
+_SQL_SET_SCHEMA_HASH = "UPDATE [sync].[SyncMeta] SET SourceSchemaHash = ? WHERE BranchName = ? AND TableName = ?"
+_SIZES_GET_META = [_META_NAME_PARAM, _META_NAME_PARAM]
+_SIZES_INSERT_META = [_META_NAME_PARAM, _META_NAME_PARAM, _META_NAME_PARAM, _META_STATUS_PARAM]
+_SIZES_SET_SCHEMA_HASH = [_META_HASH_PARAM, _META_NAME_PARAM, _META_NAME_PARAM]
+# For callers that append the watermark update to their own statement batch: params (last_value, branch, table)
+SQL_UPDATE_LAST_VALUE = "UPDATE [sync].[SyncMeta] SET LastValue = ?, LastSynced = GETDATE() WHERE BranchName = ? AND TableName = ?"
+UPDATE_LAST_VALUE_INPUT_SIZES = [_META_NAME_PARAM, _META_NAME_PARAM, _META_NAME_PARAM]
+
+ODBC_DRIVER = "ODBC Driver 17 for SQL Server" # Or other appropriate driver like SQL Server Native Client 10.0 for older systems
+# Driver 18 defaults to Encrypt=yes; add "Encrypt=Optional;" to the template if switching to it without TLS on the servers.
+_CONN_TEMPLATE = "DRIVER={{{driver}}};SERVER={server},{port};UID={username};PWD={password};TrustServerCertificate=yes;"
+
+# SQLSTATEs (ex.args[0]) worth retrying: link failure, cannot connect, timeout, deadlock victim, Azure DB unavailable.
+# Anything else (e.g. 28000 login failed, 42000 syntax/permission) is raised on the first attempt.
+TRANSIENT_SQLSTATES = frozenset({'08S01', '08001', 'HYT00', '40001', '40613'})
+
+def retry_on_transient(max_retries=3, base=1.0, cap=30.0, jitter=0.5):
+    """
+    Decorator: retries the wrapped call on pyodbc errors with a transient SQLSTATE, at most max_retries
+    attempts in total, sleeping min(cap, base * 2**attempt * (1 + random.uniform(0, jitter))) between them.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except pyodbc.Error as ex:
+                    sqlstate = ex.args[0] if ex.args else None
+                    if sqlstate not in TRANSIENT_SQLSTATES or attempt == max_retries - 1:
+                        raise
+                    delay = min(cap, base * 2 ** attempt * (1 + random.uniform(0, jitter)))
+                    log_print(f"Transient error (SQLSTATE {sqlstate}) in {func.__name__}, attempt {attempt + 1}/{max_retries}. "
+                              f"Retrying in {delay:.1f}s.", level="warning")
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+@retry_on_transient(max_retries=3, base=1.0, cap=30.0, jitter=0.5)
 def connect_to_db(server, port, username, password, database=None, autocommit=False, timeout=5):
     """Establishes a connection to the SQL Server database."""
     try:
-        conn_str = (
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};" # Or other appropriate driver like {{SQL Server Native Client 10.0}} for older systems
-            f"SERVER={server},{port};"
-            f"UID={username};PWD={password};"
-            f"TrustServerCertificate=yes;"
-        )
-        if database:
-            conn_str += f"DATABASE={database};"
+        conn_str = _CONN_TEMPLATE.format_map(
+            {'driver': ODBC_DRIVER, 'server': server, 'port': port, 'username': username, 'password': password}
+        ) + (f"DATABASE={database};" if database else "")
         
         conn = pyodbc.connect(conn_str, timeout=timeout, autocommit=autocommit)
         log_print(f"Successfully connected to {server}:{port}/{database or 'master'}", level="info")
@@ -26,39 +138,218 @@ def connect_to_db(server, port, username, password, database=None, autocommit=Fa
         raise
 
 
+def exec_cached(conn: pyodbc.Connection, sql: str, params=(), input_sizes: list[tuple] | None = None) -> tuple[list, int]:
+    """
+    Executes sql on a cursor dedicated to that exact statement text on this connection.
+    Returns (rows of the first result set, or [] if it has none; rowcount of the statement).
+    The result is always read to the end, so the cursor never leaves the (non-MARS) connection busy.
+    pyodbc only keeps the most recent statement prepared per cursor, so one cursor per statement lets repeated
+    calls skip re-preparing. input_sizes, if given, is bound via setinputsizes once when the cursor is created.
+    The connection must be used by one thread at a time (as pooled connections are).
+    """
+    with _STMT_CURSORS_LOCK:
+        entry = _STMT_CURSORS.get(id(conn))
+        if entry is None:
+            entry = _STMT_CURSORS[id(conn)] = (conn, OrderedDict())
+    stmt_cursors = entry[1]
+    cur = stmt_cursors.get(sql)
+    if cur is None:
+        cur = stmt_cursors[sql] = conn.cursor()
+        if input_sizes:
+            cur.setinputsizes(input_sizes)
+        if len(stmt_cursors) > STMT_CURSORS_MAX_PER_CONN:
+            _, evicted = stmt_cursors.popitem(last=False)
+            try:
+                evicted.close()
+            except pyodbc.Error:
+                pass
+    else:
+        stmt_cursors.move_to_end(sql)
+    try:
+        cur.execute(sql, params)
+        rowcount = cur.rowcount
+        rows = cur.fetchall() if cur.description is not None else []
+        while cur.nextset():
+            pass
+    except pyodbc.Error:
+        # Drop the cursor so a half-read result cannot linger on the connection
+        stmt_cursors.pop(sql, None)
+        try:
+            cur.close()
+        except pyodbc.Error:
+            pass
+        raise
+    return rows, rowcount
+
+
+def _forget_cached_cursors(conn: pyodbc.Connection):
+    with _STMT_CURSORS_LOCK:
+        entry = _STMT_CURSORS.pop(id(conn), None)
+    if entry:
+        for cur in entry[1].values():
+            try:
+                cur.close()
+            except pyodbc.Error:
+                pass
+
+
+def _close_quietly(conn: pyodbc.Connection):
+    _forget_cached_cursors(conn)
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
+
+
+def _is_usable(conn: pyodbc.Connection) -> bool:
+    """Cheap liveness probe for a pooled connection that has been idle for a while."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        return True
+    except pyodbc.Error:
+        return False
+
+
+def acquire_connection(server, port, username, password, database=None, autocommit=False, timeout=5) -> pyodbc.Connection:
+    """
+    Checks out a pooled connection for the given server/port/user/database/autocommit combination,
+    opening a new one via connect_to_db if no usable idle connection exists.
+    Must be returned with release_connection (or use the acquire() context manager).
+    """
+    key = (server, str(port), username, password, database, autocommit)
+    now = time.monotonic()
+    conn = None
+
+    while conn is None:
+        with _POOL_LOCK:
+            idle = _POOL.get(key)
+            if not idle:
+                break
+            candidate, released_at = idle.pop()
+        idle_for = now - released_at
+        if idle_for > POOL_MAX_IDLE_SECONDS:
+            _close_quietly(candidate)
+        elif idle_for > POOL_VALIDATE_AFTER_SECONDS and not _is_usable(candidate):
+            log_print(f"Discarding dead pooled connection to {server}:{port}/{database or 'master'}.", level="debug")
+            _close_quietly(candidate)
+        else:
+            conn = candidate
+
+    if conn is None:
+        conn = connect_to_db(server, port, username, password, database=database, autocommit=autocommit, timeout=timeout)
+
+    with _POOL_LOCK:
+        _CHECKED_OUT[id(conn)] = key
+    return conn
+
+
+def release_connection(conn: pyodbc.Connection, discard: bool = False):
+    """
+    Returns a connection obtained from acquire_connection to the pool.
+    Any open transaction is rolled back first; the connection is closed instead if discard is True
+    or the rollback fails.
+    """
+    with _POOL_LOCK:
+        key = _CHECKED_OUT.pop(id(conn), None)
+
+    if key is None or discard:
+        _close_quietly(conn)
+        return
+    if not conn.autocommit:
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            _close_quietly(conn)
+            return
+
+    with _POOL_LOCK:
+        idle = _POOL.setdefault(key, [])
+        if len(idle) < POOL_MAX_IDLE_PER_KEY:
+            idle.append((conn, time.monotonic()))
+            return
+    _close_quietly(conn)
+
+
+def reset_process_state():
+    """
+    Forgets, without closing, all pooled connections, cached statement cursors and the disk schema cache handle,
+    and recreates their locks. For worker processes, which must not use (or close) handles that belong to the
+    parent process or inherit a lock another parent thread was holding.
+    """
+    global _POOL_LOCK, _STMT_CURSORS_LOCK, _SCHEMA_DISK_CACHE, _SCHEMA_DISK_CACHE_LOCK
+    _POOL_LOCK = threading.Lock()
+    _POOL.clear()
+    _CHECKED_OUT.clear()
+    _STMT_CURSORS_LOCK = threading.Lock()
+    _STMT_CURSORS.clear()
+    _SCHEMA_DISK_CACHE_LOCK = threading.Lock()
+    _SCHEMA_DISK_CACHE = None
+
+def set_pool_max_idle_per_key(max_idle: int):
+    """
+    Sets how many idle connections are kept per pool key, e.g. to the number of connections that can be in use
+    against one target at once. Idle connections beyond the new limit are closed.
+    """
+    global POOL_MAX_IDLE_PER_KEY
+    POOL_MAX_IDLE_PER_KEY = max(1, max_idle)
+    surplus = []
+    with _POOL_LOCK:
+        for idle in _POOL.values():
+            while len(idle) > POOL_MAX_IDLE_PER_KEY:
+                surplus.append(idle.pop(0)[0]) # Oldest first
+    for conn in surplus:
+        _close_quietly(conn)
+
+
+@contextmanager
+def acquire(server, port, username, password, database=None, autocommit=False, timeout=5):
+    """Context manager around acquire_connection/release_connection; discards the connection on error."""
+    conn = acquire_connection(server, port, username, password, database=database, autocommit=autocommit, timeout=timeout)
+    try:
+        yield conn
+    except Exception:
+        release_connection(conn, discard=True)
+        raise
+    else:
+        release_connection(conn)
+
+
 def ensure_database_exists(master_conn_details, db_name):
     """
     Ensures a database exists. Connects to 'master' to create it if not present.
     master_conn_details should be a dict with server, port, username, password.
+    Runs at most once per process per (server, port, database) once it has succeeded.
     """
-    conn = None
+    setup_key = (master_conn_details['server'].lower(), str(master_conn_details['port']), db_name.lower())
+    with _SETUP_LOCK:
+        if setup_key in _DATABASES_ENSURED:
+            return
     try:
         log_print(f"Ensuring database '{db_name}' exists on {master_conn_details['server']}.", level="info")
-        conn = connect_to_db(
+        with acquire(
             server=master_conn_details['server'],
             port=master_conn_details['port'],
             username=master_conn_details['username'],
             password=master_conn_details['password'],
             database='master',
             autocommit=True 
-        )
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM sys.databases WHERE name = ?", (db_name,))
-        if cur.fetchone():
-            log_print(f"Database '{db_name}' already exists.", level="info")
-        else:
-            log_print(f"Database '{db_name}' does not exist. Attempting to create.", level="info")
-            safe_db_name = db_name.replace("'", "''").replace("]", "]]") 
-            create_db_sql = f"CREATE DATABASE [{safe_db_name}]"
-            cur.execute(create_db_sql)
-            log_print(f"Database '{db_name}' created successfully.", level="success")
-        cur.close()
+        ) as conn, conn.cursor() as cur:
+            cur.setinputsizes([_SYSNAME_PARAM])
+            cur.execute(_SQL_DATABASE_EXISTS, db_name)
+            if cur.fetchone():
+                log_print(f"Database '{db_name}' already exists.", level="info")
+            else:
+                log_print(f"Database '{db_name}' does not exist. Attempting to create.", level="info")
+                cur.setinputsizes([_SYSNAME_PARAM])
+                cur.execute(_SQL_CREATE_DATABASE, db_name)
+                log_print(f"Database '{db_name}' created successfully.", level="success")
     except pyodbc.Error as e:
         log_print(f"Error ensuring database '{db_name}' exists: {e}", level="error")
         raise
-    finally:
-        if conn:
-            conn.close()
+    with _SETUP_LOCK:
+        _DATABASES_ENSURED.add(setup_key)
 
 
 def ensure_sync_schema_and_meta(db_conn: pyodbc.Connection): # Expects a connection
@@ -66,8 +357,17 @@ def ensure_sync_schema_and_meta(db_conn: pyodbc.Connection): # Expects a connect
     Ensures the 'sync' schema and 'SyncMeta' table (with new status columns) exist.
     This function manages its own commit for DDL changes to SyncMeta.
     Uses DATETIME for SQL Server 2008 compatibility for new timestamp columns.
+    All checks run as one batch; once it has succeeded for a server/database, later calls for it return immediately.
     """
-    create_sync_meta_sql = """
+    setup_key = (str(db_conn.getinfo(pyodbc.SQL_SERVER_NAME)).lower(), str(db_conn.getinfo(pyodbc.SQL_DATABASE_NAME)).lower())
+    with _SETUP_LOCK:
+        if setup_key in _SYNC_META_READY:
+            return
+
+    ensure_sync_schema_and_meta_sql = """
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM sys.schemas WHERE name = 'sync') BEGIN EXEC('CREATE SCHEMA [sync]') END
+
     IF NOT EXISTS (
         SELECT 1
         FROM INFORMATION_SCHEMA.TABLES
@@ -82,6 +382,7 @@ def ensure_sync_schema_and_meta(db_conn: pyodbc.Connection): # Expects a connect
             SyncStatus NVARCHAR(20) DEFAULT 'Pending' NOT NULL,
             LastCompletionTime DATETIME NULL,      -- Using DATETIME for SQL 2008 compat
             SyncRemarks NVARCHAR(MAX) NULL,                    
+            SourceSchemaHash NVARCHAR(64) NULL,    -- Hash of the source schema the target was last aligned to
             CONSTRAINT PK_SyncMeta PRIMARY KEY (BranchName, TableName)
         );
         CREATE INDEX IX_SyncMeta_LastSynced ON [sync].[SyncMeta](LastSynced);
@@ -105,127 +406,372 @@ def ensure_sync_schema_and_meta(db_conn: pyodbc.Connection): # Expects a connect
             ALTER TABLE [sync].[SyncMeta] ADD SyncRemarks NVARCHAR(MAX) NULL;
             PRINT 'Added SyncRemarks column to SyncMeta.';
         END
+        IF NOT EXISTS (SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = 'sync' AND TABLE_NAME = 'SyncMeta' AND COLUMN_NAME = 'SourceSchemaHash')
+        BEGIN
+            ALTER TABLE [sync].[SyncMeta] ADD SourceSchemaHash NVARCHAR(64) NULL;
+            PRINT 'Added SourceSchemaHash column to SyncMeta.';
+        END
         -- Note: Altering existing LastSynced from DATETIME2 to DATETIME if needed is complex and not handled here.
         -- This script ensures new creations use DATETIME and adds new columns as DATETIME.
     END
     """
     try:
         with db_conn.cursor() as cur:
-            cur.execute("IF NOT EXISTS (SELECT 1 FROM sys.schemas WHERE name = 'sync') BEGIN EXEC('CREATE SCHEMA [sync]') END")
-            log_print("Ensured 'sync' schema exists in target.", level="debug")
-            
-            cur.execute(create_sync_meta_sql)
-            log_print("Ensured 'sync.SyncMeta' table structure is up-to-date with status columns.", level="debug")
+            cur.execute(ensure_sync_schema_and_meta_sql)
+            log_print("Ensured 'sync' schema and 'sync.SyncMeta' table structure are up-to-date with status columns.", level="debug")
         db_conn.commit() 
+        with _SETUP_LOCK:
+            _SYNC_META_READY.add(setup_key)
     except pyodbc.Error as e:
         log_print(f"Error ensuring sync schema/meta table structure: {e}", level="error")
         db_conn.rollback()
         raise
 
-def get_sync_meta_entry(cursor: pyodbc.Cursor, branch_name: str, table_name: str, create_if_not_exists: bool = True) -> dict | None:
+def bulk_seed_sync_meta(cursor: pyodbc.Cursor, rows: list[tuple[str, str]]):
     """
-    Gets the full SyncMeta entry for a table and branch.
-    If create_if_not_exists is True, it creates a 'Pending' entry if one doesn't exist.
-    This function does NOT commit; relies on calling context for transaction management if create_if_not_exists is True.
+    Inserts 'Pending' SyncMeta rows (watermark '0') for many (branch_name, table_name) pairs that do not have one yet,
+    using fast_executemany in chunks of SQL_SERVER_MAX_VALUES_ROWS. Callers pass only missing pairs; one created
+    concurrently in the meantime is left as it is.
+    Uses the provided cursor and does NOT commit.
     """
-    default_last_value = '0'
-    default_status = 'Pending'
-    
+    if not rows:
+        return
     try:
-        cursor.execute(
-            "SELECT LastValue, LastSynced, SyncStatus, LastCompletionTime, SyncRemarks "
-            "FROM [sync].[SyncMeta] WHERE BranchName = ? AND TableName = ?",
-            (branch_name, table_name)
-        )
-        row = cursor.fetchone()
-        if row:
-            return {
-                "LastValue": str(row[0]), "LastSynced": row[1], "SyncStatus": row[2],
-                "LastCompletionTime": row[3], "SyncRemarks": row[4]
-            }
-        elif create_if_not_exists:
-            log_print(f"No SyncMeta entry for {branch_name}:{table_name}. Creating with status '{default_status}'.", level="info")
-            # Use GETDATE() for LastSynced on initial insert
-            cursor.execute(
-                "INSERT INTO [sync].[SyncMeta] (BranchName, TableName, LastValue, SyncStatus, LastSynced) VALUES (?, ?, ?, ?, GETDATE())",
-                (branch_name, table_name, default_last_value, default_status)
-            )
-            # NO COMMIT HERE - calling function must commit this insert as part of its transaction
-            return {
-                "LastValue": default_last_value, "LastSynced": None, # Will be set by GETDATE() in DB
-                "SyncStatus": default_status, "LastCompletionTime": None, "SyncRemarks": None
-            }
-        else:
-            return None 
+        cursor.fast_executemany = True
+        cursor.setinputsizes(_SIZES_INSERT_META)
+        for chunk in _chunks(rows, SQL_SERVER_MAX_VALUES_ROWS):
+            cursor.executemany(_SQL_INSERT_META, [(branch_name, table_name, '0', 'Pending') for branch_name, table_name in chunk])
+        log_print(f"Seeded {len(rows)} SyncMeta row(s).", level="info")
     except pyodbc.Error as e:
-        log_print(f"Error getting SyncMeta entry for {branch_name}:{table_name}: {e}", level="error")
+        log_print(f"Error seeding {len(rows)} SyncMeta row(s): {e}", level="error")
         raise
 
-def update_last_synced_value(cursor: pyodbc.Cursor, branch_name: str, table_name: str, last_value: str):
+def schema_hash(schema_details: dict) -> str:
+    """Stable hex digest of a get_table_schema_details() result (columns, types, nullability, PK)."""
+    payload = json.dumps(schema_details, sort_keys=True, default=str) # ColInfo serializes via its field-ordered repr
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+def get_source_schema_hash(cursor: pyodbc.Cursor, branch_name: str, table_name: str) -> str | None:
+    """Returns the SourceSchemaHash stored for a table and branch, or None if there is none."""
+    try:
+        rows, _ = exec_cached(cursor.connection, _SQL_GET_SCHEMA_HASH, (branch_name, table_name), _SIZES_GET_META)
+        return rows[0][0] if rows else None
+    except pyodbc.Error as e:
+        log_print(f"Error getting SourceSchemaHash for {branch_name}:{table_name}: {e}", level="error")
+        raise
+
+def set_source_schema_hash(cursor: pyodbc.Cursor, branch_name: str, table_name: str, hash_value: str | None):
     """
-    Updates ONLY the LastValue and LastSynced timestamp for a table and branch.
+    Stores the SourceSchemaHash for an existing SyncMeta row; None clears it, so the next alignment compares schemas.
     Uses the provided cursor and does NOT commit.
     """
     try:
-        # Use GETDATE() for LastSynced
-        cursor.execute(
-            "UPDATE [sync].[SyncMeta] SET LastValue = ?, LastSynced = GETDATE() WHERE BranchName = ? AND TableName = ?",
-            (str(last_value), branch_name, table_name)
-        )
-        if cursor.rowcount == 0:
-            # This should ideally not happen if get_sync_meta_entry created the row.
-            # This indicates a potential logic flaw or concurrent deletion.
-            log_print(f"CRITICAL: No row found in SyncMeta to update LastValue for {branch_name}:{table_name}. "
-                      f"This implies the row was not created by get_sync_meta_entry or was deleted.", level="critical")
-            # Avoid inserting here as it might hide a problem. The row should exist.
-            # If it must be robust against this, an insert could be attempted, but it's a sign of an issue.
-            # raise pyodbc.Error(f"SyncMeta row not found for {branch_name}:{table_name} during LastValue update.")
+        exec_cached(cursor.connection, _SQL_SET_SCHEMA_HASH, (hash_value, branch_name, table_name), _SIZES_SET_SCHEMA_HASH)
     except pyodbc.Error as e:
-        log_print(f"Error updating last synced value for {branch_name}:{table_name} to {last_value}: {e}", level="error")
+        log_print(f"Error setting SourceSchemaHash for {branch_name}:{table_name}: {e}", level="error")
         raise
 
-def update_sync_meta_status(cursor: pyodbc.Cursor, branch_name: str, table_name: str, status: str, remarks: str | None = None):
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def get_sync_meta_entries(cursor: pyodbc.Cursor, branch_name: str, table_names: list[str]) -> dict[str, dict]:
     """
-    Updates the SyncStatus, LastCompletionTime (if status is 'Complete'), and SyncRemarks.
-    Uses the provided cursor and does NOT commit. Uses GETDATE() for timestamps.
+    Reads the SyncMeta entries of several tables for one branch in a single round-trip per chunk.
+    Returns {table_name: {"LastValue", "LastSynced", "SyncStatus", "LastCompletionTime", "SyncRemarks"}};
+    tables without a row are omitted.
     """
+    entries = {}
+    requested = {name.lower(): name for name in table_names}
     try:
-        if status == 'Complete':
-            sql = """
-                UPDATE [sync].[SyncMeta]
-                SET SyncStatus = ?, LastCompletionTime = GETDATE(), SyncRemarks = ?, LastSynced = GETDATE()
-                WHERE BranchName = ? AND TableName = ?
-            """
-            params = (status, remarks, branch_name, table_name)
-        else:
-            sql = """
-                UPDATE [sync].[SyncMeta]
-                SET SyncStatus = ?, SyncRemarks = ?, LastSynced = GETDATE() 
-                WHERE BranchName = ? AND TableName = ?
+        for chunk in _chunks(list(requested.values()), SQL_SERVER_MAX_PARAMS - 1):
+            rows, _ = exec_cached(
+                cursor.connection,
+                "SELECT TableName, LastValue, LastSynced, SyncStatus, LastCompletionTime, SyncRemarks "
+                f"FROM [sync].[SyncMeta] WHERE BranchName = ? AND TableName IN ({', '.join(['?'] * len(chunk))})",
+                (branch_name, *chunk),
+                [_META_NAME_PARAM] * (len(chunk) + 1)
+            )
+            for row in rows:
+                table_name = requested.get(row[0].lower(), row[0])
+                entries[table_name] = {
+                    "LastValue": str(row[1]), "LastSynced": row[2], "SyncStatus": row[3],
+                    "LastCompletionTime": row[4], "SyncRemarks": row[5]
+                }
+    except pyodbc.Error as e:
+        log_print(f"Error getting SyncMeta entries for branch {branch_name}: {e}", level="error")
+        raise
+    return entries
+
+_FLUSH_SYNC_META_COLUMNS = ("BranchName", "TableName", "LastValue", "SyncStatus", "SyncRemarks")
+
+def flush_sync_meta(cursor: pyodbc.Cursor, pending_updates: dict[tuple[str, str], dict]):
+    """
+    Writes all pending SyncMeta changes with one set-based MERGE per chunk instead of one statement per row.
+    pending_updates maps (branch_name, table_name) to a dict with any of:
+      'LastValue' - new watermark (omitted/None keeps the current value),
+      'Status'    - new SyncStatus; 'Complete' also stamps LastCompletionTime (omitted/None keeps status and remarks),
+      'Remarks'   - SyncRemarks written together with Status.
+    Rows that do not exist yet are created ('0' watermark, 'Pending' status unless given); HOLDLOCK keeps the key range
+    locked between the match and the insert, so concurrent flushes for the same new row cannot both insert it.
+    Uses the provided cursor and does NOT commit.
+    """
+    if not pending_updates:
+        return
+
+    rows = [
+        (branch_name, table_name,
+         None if update.get("LastValue") is None else str(update["LastValue"]),
+         update.get("Status"), update.get("Remarks"))
+        for (branch_name, table_name), update in pending_updates.items()
+    ]
+    rows_per_chunk = min(SQL_SERVER_MAX_VALUES_ROWS, SQL_SERVER_MAX_PARAMS // len(_FLUSH_SYNC_META_COLUMNS))
+
+    try:
+        for chunk in _chunks(rows, rows_per_chunk):
+            values_sql = ", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))
+            merge_sql = f"""
+                MERGE [sync].[SyncMeta] WITH (HOLDLOCK) AS T
+                USING (
+                    SELECT CAST(V.BranchName AS NVARCHAR(255)) AS BranchName, CAST(V.TableName AS NVARCHAR(255)) AS TableName,
+                           CAST(V.LastValue AS NVARCHAR(255)) AS LastValue, CAST(V.SyncStatus AS NVARCHAR(20)) AS SyncStatus,
+                           CAST(V.SyncRemarks AS NVARCHAR(MAX)) AS SyncRemarks
+                    FROM (VALUES {values_sql}) AS V({', '.join(_FLUSH_SYNC_META_COLUMNS)})
+                ) AS S
+                ON T.BranchName = S.BranchName AND T.TableName = S.TableName
+                WHEN MATCHED THEN UPDATE SET
+                    LastValue = COALESCE(S.LastValue, T.LastValue),
+                    SyncStatus = COALESCE(S.SyncStatus, T.SyncStatus),
+                    SyncRemarks = CASE WHEN S.SyncStatus IS NULL THEN T.SyncRemarks ELSE S.SyncRemarks END,
+                    LastCompletionTime = CASE WHEN S.SyncStatus = 'Complete' THEN GETDATE() ELSE T.LastCompletionTime END,
+                    LastSynced = GETDATE()
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT (BranchName, TableName, LastValue, SyncStatus, SyncRemarks, LastSynced, LastCompletionTime)
+                    VALUES (S.BranchName, S.TableName, COALESCE(S.LastValue, '0'), COALESCE(S.SyncStatus, 'Pending'), S.SyncRemarks,
+                            GETDATE(), CASE WHEN S.SyncStatus = 'Complete' THEN GETDATE() END);
             """
-            params = (status, remarks, branch_name, table_name)
-        
-        cursor.execute(sql, params)
-        
-        if cursor.rowcount == 0:
-            # This is critical. get_sync_meta_entry should have created the row if it didn't exist,
-            # and that creation should be part of the same transaction that this update is in,
-            # or committed before this function is called in a new transaction.
-            log_print(f"CRITICAL: SyncMeta row for {branch_name}:{table_name} was expected but not found for status update to '{status}'. "
-                      "The row should have been created by get_sync_meta_entry.", level="critical")
-            # To prevent silent failures or data loss, it's better to raise an error here.
-            # The calling function should ensure the row exists before calling update_sync_meta_status.
-            # raise pyodbc.Error(f"SyncMeta row not found for {branch_name}:{table_name} during status update.")
+            exec_cached(
+                cursor.connection, merge_sql, [value for row in chunk for value in row],
+                [_META_NAME_PARAM, _META_NAME_PARAM, _META_NAME_PARAM, _META_STATUS_PARAM, _META_REMARKS_PARAM] * len(chunk)
+            )
     except pyodbc.Error as e:
-        log_print(f"Error updating SyncMeta status for {branch_name}:{table_name} to {status}: {e}", level="error")
+        log_print(f"Error flushing {len(rows)} SyncMeta update(s): {e}", level="error")
         raise
 
+@dataclass(slots=True)
+class ColInfo:
+    """Schema details of one column, as returned in get_table_schema_details()['columns']. Treat as read-only."""
+    table_schema_name: str
+    data_type: str # lowercased
+    max_length: int | None
+    numeric_precision: int | None
+    numeric_scale: int | None
+    datetime_precision: int | None
+    is_nullable: bool
+    column_default: str | None
+    ordinal_position: int
+
+def _int_or_none(value) -> int | None:
+    return int(value) if value is not None else None
+
+_NULLABLE_MAP = {'YES': True, 'NO': False} # INFORMATION_SCHEMA.COLUMNS.IS_NULLABLE
+_TYPE_INTERN: dict[str, str] = {} # DATA_TYPE as returned -> interned lowercase name (a few dozen distinct types)
+
+def _data_type_name(raw: str) -> str:
+    dtype = _TYPE_INTERN.get(raw)
+    if dtype is None:
+        dtype = _TYPE_INTERN.setdefault(raw, sys.intern(raw.lower()))
+    return dtype
+
+def invalidate_schema_cache(table_name: str, table_schema_name: str | None = None):
+    """Drops cached schema details for a table (on every server/database), e.g. after DDL was run against it."""
+    table_key = table_name.lower()
+    schema_key = table_schema_name.lower() if table_schema_name else None
+    with _SCHEMA_CACHE_LOCK:
+        for key in [k for k in _SCHEMA_CACHE if k[3] == table_key and (schema_key is None or k[2] == schema_key)]:
+            del _SCHEMA_CACHE[key]
+    if schema_key is None:
+        _disk_cache_execute("DELETE FROM table_schemas WHERE table_name = ?", (table_key,))
+    else:
+        _disk_cache_execute("DELETE FROM table_schemas WHERE table_name = ? AND schema_name = ?", (table_key, schema_key))
+
 def get_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_schema_name: str = 'dbo') -> dict | None:
     """
-    Fetches detailed schema information for a given table.
-    SQL Server 2008 Compatible (uses CASE instead of IIF).
+    Fetches detailed schema information for a given table, served from a per-process LRU cache
+    keyed by (server, database, schema, table) with a TTL of SCHEMA_CACHE_TTL_SECONDS, then from the
+    disk cache if the table's modify_date still matches.
+    Missing tables are not cached. The returned dict is shared; callers must not mutate it.
+    """
+    server_db = _schema_cache_server_db(db_cursor.connection)
+    cache_key = (*server_db, table_schema_name.lower(), table_name.lower())
+    now = time.monotonic()
+    cached = _schema_cache_get(cache_key, now)
+    if cached is None:
+        cached = _schema_disk_cache_get(db_cursor, server_db, table_schema_name, [table_name], now).get(table_name)
+    if cached is not None:
+        return cached
+
+    fetched = _fetch_table_schema_details(db_cursor, table_name, table_schema_name)
+    if fetched is None:
+        return None
+    schema_details, modify_date = fetched
+    _schema_cache_put(cache_key, schema_details, now, modify_date)
+    return schema_details
+
+def get_table_schemas_bulk(db_cursor: pyodbc.Cursor, table_schema_name: str, table_names: list[str]) -> dict[str, dict]:
+    """
+    Fetches schema details for many tables of one schema with a single query per chunk of names and stores them
+    in the schema cache, so later get_table_schema_details calls for them are served without a round-trip.
+    Tables that are already cached are not re-read. Returns {table_name: schema details}; missing tables are omitted.
+    """
+    server_db = _schema_cache_server_db(db_cursor.connection)
+    schema_key = table_schema_name.lower()
+    now = time.monotonic()
+    results = {}
+    missed = []
+    for table_name in table_names:
+        cached = _schema_cache_get((*server_db, schema_key, table_name.lower()), now)
+        if cached is not None:
+            results[table_name] = cached
+        else:
+            missed.append(table_name)
+    if missed:
+        results.update(_schema_disk_cache_get(db_cursor, server_db, table_schema_name, missed, now))
+    to_fetch = {table_name.lower(): table_name for table_name in missed if table_name not in results}
+    if not to_fetch:
+        return results
+
+    rows_by_table: dict[str, list] = {}
+    try:
+        for chunk in _chunks(list(to_fetch.values()), SQL_SERVER_MAX_PARAMS - 1):
+            db_cursor.execute(
+                _SCHEMA_DETAILS_SQL.format(where=f"C.TABLE_SCHEMA = ? AND C.TABLE_NAME IN ({', '.join(['?'] * len(chunk))})"),
+                table_schema_name, *chunk
+            )
+            for row_data in db_cursor.fetchall():
+                rows_by_table.setdefault(row_data[1].lower(), []).append(row_data) # [1] is TABLE_NAME
+    except pyodbc.Error as e:
+        log_print(f"Error fetching schemas for {len(to_fetch)} table(s) in schema {table_schema_name}: {e}", level="error")
+        return results
+
+    for table_key, rows in rows_by_table.items():
+        table_name = to_fetch.get(table_key)
+        if table_name is None:
+            continue
+        schema_details = _schema_details_from_rows(rows)
+        _schema_cache_put((*server_db, schema_key, table_key), schema_details, now, rows[0][-1]) # [-1] is MODIFY_DATE
+        results[table_name] = schema_details
+    return results
+
+def _schema_cache_server_db(conn: pyodbc.Connection) -> tuple[str, str]:
+    """
+    Identifies the server and database for schema cache keys. @@SERVERNAME alone can repeat across branch servers
+    restored from one image, so the configured host and port of a pooled connection are part of the server name.
+    """
+    server_name = str(conn.getinfo(pyodbc.SQL_SERVER_NAME)).lower()
+    with _POOL_LOCK:
+        pool_key = _CHECKED_OUT.get(id(conn))
+    if pool_key is not None:
+        server_name = f"{pool_key[0]},{pool_key[1]}/{server_name}".lower()
+    return server_name, str(conn.getinfo(pyodbc.SQL_DATABASE_NAME)).lower()
+
+def _schema_cache_get(cache_key: tuple, now: float) -> dict | None:
+    with _SCHEMA_CACHE_LOCK:
+        cached = _SCHEMA_CACHE.get(cache_key)
+        if cached and now - cached[0] < SCHEMA_CACHE_TTL_SECONDS:
+            _SCHEMA_CACHE.move_to_end(cache_key)
+            return cached[1]
+    return None
+
+def _schema_cache_put(cache_key: tuple, schema_details: dict, fetched_at: float, modify_date: str | None = None):
+    """Stores details in memory and, if the table's modify_date is given, on disk."""
+    with _SCHEMA_CACHE_LOCK:
+        _SCHEMA_CACHE[cache_key] = (fetched_at, schema_details)
+        _SCHEMA_CACHE.move_to_end(cache_key)
+        while len(_SCHEMA_CACHE) > SCHEMA_CACHE_MAX_ENTRIES:
+            _SCHEMA_CACHE.popitem(last=False)
+    if modify_date is not None:
+        _disk_cache_execute(
+            "INSERT OR REPLACE INTO table_schemas (server, db, schema_name, table_name, modify_date, details) VALUES (?, ?, ?, ?, ?, ?)",
+            (*cache_key, modify_date, pickle.dumps(schema_details, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+
+def _schema_disk_cache_get(db_cursor: pyodbc.Cursor, server_db: tuple[str, str], table_schema_name: str,
+                           table_names: list[str], now: float) -> dict[str, dict]:
+    """
+    Returns {table_name: schema details} for the disk cache entries whose stored modify_date still matches the
+    table's current one (one catalog query per chunk of names); those are promoted into the in-memory cache.
+    """
+    schema_key = table_schema_name.lower()
+    stored = {}
+    for table_name in table_names:
+        row = _disk_cache_execute(
+            "SELECT modify_date, details FROM table_schemas WHERE server = ? AND db = ? AND schema_name = ? AND table_name = ?",
+            (*server_db, schema_key, table_name.lower()), fetch=True
+        )
+        if row:
+            stored[table_name.lower()] = (table_name, row[0], row[1])
+    if not stored:
+        return {}
+
+    current = {}
+    try:
+        for chunk in _chunks([table_name for table_name, _, _ in stored.values()], SQL_SERVER_MAX_PARAMS - 1):
+            db_cursor.execute(
+                f"SELECT O.name, {_MODIFY_DATE_SQL.format(alias='O')} FROM sys.objects AS O "
+                f"WHERE O.schema_id = SCHEMA_ID(?) AND O.name IN ({', '.join(['?'] * len(chunk))})",
+                table_schema_name, *chunk
+            )
+            current.update((name.lower(), modify_date) for name, modify_date in db_cursor.fetchall())
+    except pyodbc.Error as e:
+        log_print(f"Error checking cached schemas in schema {table_schema_name}: {e}", level="debug")
+        return {}
+
+    results = {}
+    for table_key, (table_name, modify_date, details) in stored.items():
+        if current.get(table_key) != modify_date:
+            continue
+        try:
+            schema_details = pickle.loads(details)
+        except Exception:
+            continue
+        _schema_cache_put((*server_db, schema_key, table_key), schema_details, now)
+        results[table_name] = schema_details
+    return results
+
+def _disk_cache_execute(sql: str, params: tuple, fetch: bool = False):
+    """
+    Runs one statement against the on-disk schema cache (opened lazily, WAL mode, autocommit).
+    The disk cache is an optimization only: errors are logged and treated as a miss.
     """
-    schema_sql = """
+    global _SCHEMA_DISK_CACHE
+    if not SCHEMA_DISK_CACHE_PATH:
+        return None
+    with _SCHEMA_DISK_CACHE_LOCK:
+        try:
+            if _SCHEMA_DISK_CACHE is None:
+                conn = sqlite3.connect(SCHEMA_DISK_CACHE_PATH, isolation_level=None, check_same_thread=False, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("DROP TABLE IF EXISTS schema_cache") # Earlier layout, expired by wall-clock age
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS table_schemas (server TEXT NOT NULL, db TEXT NOT NULL, schema_name TEXT NOT NULL, "
+                    "table_name TEXT NOT NULL, modify_date TEXT NOT NULL, details BLOB NOT NULL, "
+                    "PRIMARY KEY (server, db, schema_name, table_name))"
+                )
+                _SCHEMA_DISK_CACHE = conn
+            cur = _SCHEMA_DISK_CACHE.execute(sql, params)
+            return cur.fetchone() if fetch else None
+        except sqlite3.Error as e:
+            log_print(f"Schema disk cache unavailable ({SCHEMA_DISK_CACHE_PATH}): {e}", level="debug")
+            return None
+
+# sys.objects.modify_date as text, the version stamp of disk schema cache entries
+_MODIFY_DATE_SQL = "CONVERT(VARCHAR(23), {alias}.modify_date, 121)"
+
+# Column and PK details per table, plus the table's modify_date; {where} filters INFORMATION_SCHEMA.COLUMNS C.
+# The select-list order is relied on by the tuple unpacking in _schema_details_from_rows.
+# SQL Server 2008 Compatible (uses CASE instead of IIF).
+_SCHEMA_DETAILS_SQL = """
     SELECT
         C.TABLE_SCHEMA,
         C.TABLE_NAME,
@@ -239,13 +785,17 @@ def get_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_sc
         C.IS_NULLABLE, 
         C.COLUMN_DEFAULT,
         PK_INFO.CONSTRAINT_NAME AS PK_CONSTRAINT_NAME,
-        PK_INFO.IS_PRIMARY_KEY_COLUMN
+        PK_INFO.IS_PRIMARY_KEY_COLUMN,
+        PK_INFO.PK_ORDINAL,
+        (SELECT """ + _MODIFY_DATE_SQL.format(alias="O") + """ FROM sys.objects AS O
+         WHERE O.object_id = OBJECT_ID(QUOTENAME(C.TABLE_SCHEMA) + '.' + QUOTENAME(C.TABLE_NAME))) AS MODIFY_DATE
     FROM
         INFORMATION_SCHEMA.COLUMNS C
     OUTER APPLY (
         SELECT
             TC.CONSTRAINT_NAME,
-            CASE WHEN KU.COLUMN_NAME IS NOT NULL THEN 1 ELSE 0 END AS IS_PRIMARY_KEY_COLUMN -- SQL 2008 Compatible
+            CASE WHEN KU.COLUMN_NAME IS NOT NULL THEN 1 ELSE 0 END AS IS_PRIMARY_KEY_COLUMN, -- SQL 2008 Compatible
+            KU.ORDINAL_POSITION AS PK_ORDINAL -- Position of the column within the PK (not the table)
         FROM
             INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS TC
         INNER JOIN
@@ -260,12 +810,17 @@ def get_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_sc
             AND TC.CONSTRAINT_TYPE = 'PRIMARY KEY'
     ) AS PK_INFO
     WHERE
-        C.TABLE_NAME = ? AND C.TABLE_SCHEMA = ?
+        {where}
     ORDER BY
-        C.ORDINAL_POSITION;
+        C.TABLE_NAME, C.ORDINAL_POSITION;
+    """
+
+def _fetch_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_schema_name: str = 'dbo') -> tuple[dict, str | None] | None:
+    """
+    Fetches detailed schema information for a given table, with the table's modify_date.
     """
     try:
-        db_cursor.execute(schema_sql, table_name, table_schema_name)
+        db_cursor.execute(_SCHEMA_DETAILS_SQL.format(where="C.TABLE_NAME = ? AND C.TABLE_SCHEMA = ?"), table_name, table_schema_name)
         rows = db_cursor.fetchall()
     except pyodbc.Error as e:
         log_print(f"Error fetching schema for table {table_schema_name}.{table_name}: {e}", level="error")
@@ -274,49 +829,34 @@ def get_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_sc
     if not rows:
         log_print(f"Table {table_schema_name}.{table_name} not found or has no columns.", level="warning")
         return None
+    return _schema_details_from_rows(rows), rows[0][-1] # [-1] is MODIFY_DATE
 
+def _schema_details_from_rows(rows: list) -> dict:
+    """Builds the get_table_schema_details() dict from one table's _SCHEMA_DETAILS_SQL rows (in ordinal order)."""
     columns_details = {}
     pk_columns_temp = {} 
     pk_constraint_name = None
 
-    for row_data in rows:
-        col_name = row_data.COLUMN_NAME
-        columns_details[col_name] = {
-            'table_schema_name': row_data.TABLE_SCHEMA,
-            'data_type': row_data.DATA_TYPE.lower(),
-            'max_length': int(row_data.MAX_LENGTH) if row_data.MAX_LENGTH is not None else None,
-            'numeric_precision': int(row_data.NUMERIC_PRECISION) if row_data.NUMERIC_PRECISION is not None else None,
-            'numeric_scale': int(row_data.NUMERIC_SCALE) if row_data.NUMERIC_SCALE is not None else None,
-            'datetime_precision': int(row_data.DATETIME_PRECISION) if row_data.DATETIME_PRECISION is not None else None,
-            'is_nullable': True if row_data.IS_NULLABLE == 'YES' else False,
-            'column_default': row_data.COLUMN_DEFAULT,
-            'ordinal_position': row_data.ORDINAL_POSITION
-        }
-        if row_data.IS_PRIMARY_KEY_COLUMN == 1:
-            pk_columns_temp[col_name] = columns_details[col_name]['ordinal_position']
-            if not pk_constraint_name and row_data.PK_CONSTRAINT_NAME:
-                pk_constraint_name = row_data.PK_CONSTRAINT_NAME
+    for (table_schema, _table_name, col_name, ordinal_position, data_type, max_length, numeric_precision, numeric_scale,
+         datetime_precision, is_nullable, column_default, pk_constraint, is_pk_column, pk_ordinal, _modify_date) in rows:
+        columns_details[col_name] = ColInfo(
+            table_schema,
+            _data_type_name(data_type),
+            _int_or_none(max_length),
+            _int_or_none(numeric_precision),
+            _int_or_none(numeric_scale),
+            _int_or_none(datetime_precision),
+            _NULLABLE_MAP[is_nullable],
+            column_default,
+            ordinal_position
+        )
+        if is_pk_column == 1:
+            pk_columns_temp[col_name] = pk_ordinal
+            if not pk_constraint_name and pk_constraint:
+                pk_constraint_name = pk_constraint
     
-    ordered_pk_columns = []
-    if pk_constraint_name: 
-        pk_order_sql = """
-        SELECT KU.COLUMN_NAME
-        FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS TC
-        INNER JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS KU
-            ON TC.CONSTRAINT_NAME = KU.CONSTRAINT_NAME AND TC.TABLE_SCHEMA = KU.TABLE_SCHEMA AND TC.TABLE_NAME = KU.TABLE_NAME
-        WHERE TC.TABLE_SCHEMA = ? AND TC.TABLE_NAME = ? AND TC.CONSTRAINT_TYPE = 'PRIMARY KEY' AND TC.CONSTRAINT_NAME = ?
-        ORDER BY KU.ORDINAL_POSITION;
-        """
-        try:
-            db_cursor.execute(pk_order_sql, table_schema_name, table_name, pk_constraint_name)
-            pk_rows = db_cursor.fetchall()
-            ordered_pk_columns = [row.COLUMN_NAME for row in pk_rows]
-        except pyodbc.Error as e:
-            log_print(f"Error fetching PK column order for {table_schema_name}.{table_name} using constraint name: {e}", level="error")
-            if pk_columns_temp:
-                 ordered_pk_columns = sorted(pk_columns_temp.keys(), key=lambda k: pk_columns_temp[k])
-    elif pk_columns_temp: 
-         ordered_pk_columns = sorted(pk_columns_temp.keys(), key=lambda k: pk_columns_temp[k])
+    # PK columns in key order, straight from KEY_COLUMN_USAGE.ORDINAL_POSITION returned by the main query
+    ordered_pk_columns = sorted(pk_columns_temp, key=pk_columns_temp.__getitem__)
 
     return {
         'columns': columns_details,
@@ -324,28 +864,37 @@ def get_table_schema_details(db_cursor: pyodbc.Cursor, table_name: str, table_sc
         'primary_key_constraint_name': pk_constraint_name
     }
 
-def get_sql_type_definition(col_details: dict) -> str:
+def get_sql_type_definition(col_details: ColInfo) -> str:
     """
     Constructs a SQL Server type definition string from column details.
+    Thin adapter over the memoized _sql_type_definition.
+    """
+    return _sql_type_definition(
+        col_details.data_type, col_details.max_length, col_details.numeric_precision,
+        col_details.numeric_scale, col_details.datetime_precision
+    )
+
+@lru_cache(maxsize=4096)
+def _sql_type_definition(dtype: str, max_len: int | None, numeric_precision: int | None,
+                         numeric_scale: int | None, datetime_precision: int | None) -> str:
+    """
+    Type definition for one (type, length, precision, scale) combination; results are interned by the cache.
     Adjusted for SQL Server 2008 compatibility where applicable.
     """
-    dtype = col_details['data_type'].lower()
-    
-    if dtype in ['nvarchar', 'varchar', 'nchar', 'char', 'binary', 'varbinary']:
-        max_len = col_details.get('max_length')
+    if dtype in ('nvarchar', 'varchar', 'nchar', 'char', 'binary', 'varbinary'):
         return f"{dtype.upper()}({max_len if max_len != -1 and max_len is not None else 'MAX'})"
-    elif dtype in ['decimal', 'numeric']:
-        precision = col_details.get('numeric_precision', 18) 
-        scale = col_details.get('numeric_scale', 0)       
+    elif dtype in ('decimal', 'numeric'):
+        precision = numeric_precision if numeric_precision is not None else 18
+        scale = numeric_scale if numeric_scale is not None else 0
         return f"{dtype.upper()}({precision}, {scale})"
     elif dtype == 'datetime2': # DATETIME2 is available in SQL Server 2008
-        precision = col_details.get('datetime_precision', 7) 
+        precision = datetime_precision if datetime_precision is not None else 7
         return f"DATETIME2({precision})"
     elif dtype == 'datetimeoffset': # DATETIMEOFFSET is available in SQL Server 2008
-        precision = col_details.get('datetime_precision', 7)
+        precision = datetime_precision if datetime_precision is not None else 7
         return f"DATETIMEOFFSET({precision})"
     elif dtype == 'time': # TIME is available in SQL Server 2008
-        precision = col_details.get('datetime_precision', 7)
+        precision = datetime_precision if datetime_precision is not None else 7
         return f"TIME({precision})"
     elif dtype == 'date': # DATE is available in SQL Server 2008
         return "DATE"
@@ -354,7 +903,78 @@ def get_sql_type_definition(col_details: dict) -> str:
     elif dtype == 'smalldatetime':
         return "SMALLDATETIME"
     elif dtype == 'float':
-        precision = col_details.get('numeric_precision') 
-        return f"FLOAT({precision})" if precision and precision <= 53 else "FLOAT" 
+        return f"FLOAT({numeric_precision})" if numeric_precision and numeric_precision <= 53 else "FLOAT" 
     else: 
         return dtype.upper()
+
+# Fixed parameter bindings (see get_input_size) for types whose size does not depend on the column
+_FIXED_INPUT_SIZES = {
+    'bigint': (pyodbc.SQL_BIGINT, 0, 0),
+    'int': (pyodbc.SQL_INTEGER, 0, 0),
+    'smallint': (pyodbc.SQL_SMALLINT, 0, 0),
+    'tinyint': (pyodbc.SQL_TINYINT, 0, 0),
+    'bit': (pyodbc.SQL_BIT, 0, 0),
+    'real': (pyodbc.SQL_REAL, 0, 0),
+    'money': (pyodbc.SQL_DECIMAL, 19, 4),
+    'smallmoney': (pyodbc.SQL_DECIMAL, 10, 4),
+    'date': (pyodbc.SQL_TYPE_DATE, 10, 0),
+    'datetime': (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3),
+    'smalldatetime': (pyodbc.SQL_TYPE_TIMESTAMP, 16, 0),
+    'uniqueidentifier': (pyodbc.SQL_GUID, 0, 0),
+    'text': (pyodbc.SQL_LONGVARCHAR, 0, 0),
+    'ntext': (pyodbc.SQL_WLONGVARCHAR, 0, 0),
+    'image': (pyodbc.SQL_LONGVARBINARY, 0, 0),
+    'xml': (pyodbc.SQL_WLONGVARCHAR, 0, 0),
+    'timestamp': (pyodbc.SQL_BINARY, 8, 0), # rowversion
+    'rowversion': (pyodbc.SQL_BINARY, 8, 0),
+    'hierarchyid': (pyodbc.SQL_LONGVARBINARY, 0, 0), # CLR types arrive as their serialized bytes
+    'geography': (pyodbc.SQL_LONGVARBINARY, 0, 0),
+    'geometry': (pyodbc.SQL_LONGVARBINARY, 0, 0),
+}
+# Anything else (e.g. sql_variant) is bound as NVARCHAR(MAX) and converted by the server
+_FALLBACK_INPUT_SIZE = (pyodbc.SQL_WLONGVARCHAR, 0, 0)
+# SQL Server specific types from msodbcsql.h; not exported by every pyodbc version
+_SQL_SS_TIME2 = -154
+_SQL_SS_TIMESTAMPOFFSET = -155
+# Variable-length types: (bounded SQL type, MAX SQL type)
+_SIZED_INPUT_TYPES = {
+    'nvarchar': (pyodbc.SQL_WVARCHAR, pyodbc.SQL_WLONGVARCHAR),
+    'nchar': (pyodbc.SQL_WCHAR, pyodbc.SQL_WLONGVARCHAR),
+    'varchar': (pyodbc.SQL_VARCHAR, pyodbc.SQL_LONGVARCHAR),
+    'char': (pyodbc.SQL_CHAR, pyodbc.SQL_LONGVARCHAR),
+    'varbinary': (pyodbc.SQL_VARBINARY, pyodbc.SQL_LONGVARBINARY),
+    'binary': (pyodbc.SQL_BINARY, pyodbc.SQL_LONGVARBINARY),
+}
+
+def get_input_size(col_details: ColInfo) -> tuple[int, int, int]:
+    """
+    setinputsizes entry (sql_type, size, decimal digits) matching a column's declared type, so fast_executemany
+    binds from the schema instead of scanning the data. Every type gets an explicit entry; there is no None.
+    """
+    return _input_size(col_details.data_type, col_details.max_length, col_details.numeric_precision,
+                       col_details.numeric_scale, col_details.datetime_precision)
+
+@lru_cache(maxsize=4096)
+def _input_size(dtype: str, max_len: int | None, numeric_precision: int | None,
+                numeric_scale: int | None, datetime_precision: int | None) -> tuple[int, int, int]:
+    fixed = _FIXED_INPUT_SIZES.get(dtype)
+    if fixed is not None:
+        return fixed
+    if dtype in _SIZED_INPUT_TYPES:
+        bounded_type, max_type = _SIZED_INPUT_TYPES[dtype]
+        return (max_type, 0, 0) if max_len is None or max_len == -1 else (bounded_type, max_len, 0)
+    if dtype in ('decimal', 'numeric'):
+        sql_type = pyodbc.SQL_DECIMAL if dtype == 'decimal' else pyodbc.SQL_NUMERIC
+        return (sql_type, numeric_precision if numeric_precision is not None else 18, numeric_scale or 0)
+    if dtype == 'datetime2':
+        precision = datetime_precision if datetime_precision is not None else 7
+        return (pyodbc.SQL_TYPE_TIMESTAMP, 20 + precision if precision else 19, precision)
+    if dtype == 'time':
+        precision = datetime_precision if datetime_precision is not None else 7
+        return (_SQL_SS_TIME2, 9 + precision if precision else 8, precision)
+    if dtype == 'datetimeoffset':
+        precision = datetime_precision if datetime_precision is not None else 7
+        return (_SQL_SS_TIMESTAMPOFFSET, 27 + precision if precision else 26, precision)
+    if dtype == 'float':
+        return (pyodbc.SQL_DOUBLE, 0, 0) if not numeric_precision or numeric_precision > 24 else (pyodbc.SQL_REAL, 0, 0)
+    return _FALLBACK_INPUT_SIZE
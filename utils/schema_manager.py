@@ -1,22 +1,32 @@
+import dataclasses
 import pyodbc
 from utils.common import log_print
-from utils.db_utils import get_table_schema_details, get_sql_type_definition
+from utils.db_utils import (
+    get_table_schema_details, get_sql_type_definition, invalidate_schema_cache,
+    schema_hash, get_source_schema_hash, set_source_schema_hash
+)
 
 # --- Constants ---
 BRANCH_ID_COL = "BranchIdentifier"
 BRANCH_ID_TYPE = "NVARCHAR(255)"
+NULLABILITY_SQL = {False: "NOT NULL", True: "NULL"} # Keyed by the column's is_nullable flag
 
 def _execute_ddl(cursor: pyodbc.Cursor, sql: str, description: str, table_name: str):
     """Helper to execute DDL and log success/failure."""
     try:
         log_print(f"Executing DDL for table '{table_name}': {sql}", level="info")
         cursor.execute(sql)
+        invalidate_schema_cache(table_name)
         log_print(f"Successfully executed DDL: {description} for table '{table_name}'.", level="success")
         return True
     except pyodbc.Error as e:
         log_print(f"Failed to execute DDL: {description} for table '{table_name}'. SQL: {sql}. Error: {e}", level="error")
         return False
 
+def _forget_failed_ddl(table_name: str):
+    """Drops cached schema after a failed DDL. Target connections are autocommit, so DDL that ran before the failure stays applied."""
+    invalidate_schema_cache(table_name)
+
 def _build_create_table_sql(table_name: str, schema_name: str, source_schema_details: dict) -> str | None:
     """
     Builds the CREATE TABLE SQL statement, injecting the BranchIdentifier column and creating a composite PK.
@@ -25,42 +35,35 @@ def _build_create_table_sql(table_name: str, schema_name: str, source_schema_det
         log_print(f"Cannot build CREATE TABLE SQL for '{table_name}': Source schema details are missing.", level="error")
         return None
 
-    column_definitions = []
-    
-    # 1. Add the BranchIdentifier column first
-    column_definitions.append(f"[{BRANCH_ID_COL}] {BRANCH_ID_TYPE} NOT NULL")
-
-    # 2. Add all columns from the source table
-    for col_name, col_details in sorted(source_schema_details['columns'].items(), key=lambda item: item[1]['ordinal_position']):
-        col_def_parts = [f"[{col_name}]"]
-        col_def_parts.append(get_sql_type_definition(col_details))
-        col_def_parts.append("NOT NULL" if not col_details['is_nullable'] else "NULL")
-        column_definitions.append(" ".join(col_def_parts))
-
-    create_table_sql = f"CREATE TABLE [{schema_name}].[{table_name}] (\n    "
-    create_table_sql += ",\n    ".join(column_definitions)
-    
+    # 1. The BranchIdentifier column first, then 2. all columns from the source table
+    definitions = [f"[{BRANCH_ID_COL}] {BRANCH_ID_TYPE} NOT NULL"]
+    definitions.extend(
+        f"[{col_name}] {get_sql_type_definition(col_details)} {NULLABILITY_SQL[col_details.is_nullable]}"
+        for col_name, col_details in sorted(source_schema_details['columns'].items(), key=lambda item: item[1].ordinal_position)
+    )
+
     # 3. Add Composite Primary Key constraint
     if source_schema_details['primary_key_columns']:
         # The new PK is the BranchIdentifier plus the original source PK(s)
-        pk_cols = [BRANCH_ID_COL] + source_schema_details['primary_key_columns']
-        pk_cols_str = ", ".join([f"[{col}]" for col in pk_cols])
+        pk_cols_str = ", ".join(f"[{col}]" for col in (BRANCH_ID_COL, *source_schema_details['primary_key_columns']))
         constraint_name = f"PK_{table_name}_Composite" # New standardized PK name
-        create_table_sql += f",\n    CONSTRAINT [{constraint_name}] PRIMARY KEY ({pk_cols_str})"
-    
-    create_table_sql += "\n);"
-    return create_table_sql
+        definitions.append(f"CONSTRAINT [{constraint_name}] PRIMARY KEY ({pk_cols_str})")
+
+    return f"CREATE TABLE [{schema_name}].[{table_name}] (\n    " + ",\n    ".join(definitions) + "\n);"
 
 def align_target_schema_to_source(
     source_cursor: pyodbc.Cursor,
     target_cursor: pyodbc.Cursor,
     table_name: str,
     source_schema_name: str = 'dbo',
-    target_schema_name: str = 'dbo'
+    target_schema_name: str = 'dbo',
+    branch_name: str | None = None
 ) -> bool:
     """
     Aligns the schema for consolidation. Creates table with composite PK or alters existing table.
     Returns True if schema is aligned and sync can proceed, False otherwise.
+    If branch_name is given, the hash of the source schema is kept in SyncMeta.SourceSchemaHash (the row must exist)
+    and the target comparison is skipped while it matches the hash of the last successful alignment.
     """
     log_print(f"Starting schema alignment for consolidated table: {table_name}", level="info")
 
@@ -69,6 +72,24 @@ def align_target_schema_to_source(
         log_print(f"Could not retrieve schema for source table {source_schema_name}.{table_name}. Halting.", level="error")
         return False
 
+    source_hash = None
+    if branch_name is not None:
+        source_hash = schema_hash(source_schema)
+        if get_source_schema_hash(target_cursor, branch_name, table_name) == source_hash:
+            log_print(f"Source schema for table {table_name} unchanged since last alignment. Skipping comparison.", level="debug")
+            return True
+
+    aligned, in_sync = _align_target_schema(source_schema, target_cursor, table_name, target_schema_name)
+    if in_sync and source_hash is not None:
+        # Only a fully matching target may skip later comparisons; unresolved differences keep being reported.
+        set_source_schema_hash(target_cursor, branch_name, table_name, source_hash)
+    return aligned
+
+def _align_target_schema(source_schema: dict, target_cursor: pyodbc.Cursor, table_name: str, target_schema_name: str) -> tuple[bool, bool]:
+    """
+    Creates or reconciles the target table against already-fetched source schema details.
+    Returns (aligned, in_sync): aligned means sync can proceed, in_sync that no column difference was left unresolved.
+    """
     target_schema = get_table_schema_details(target_cursor, table_name, target_schema_name)
 
     # --- A. Table Creation ---
@@ -76,26 +97,26 @@ def align_target_schema_to_source(
         log_print(f"Target table {table_name} does not exist. Attempting to create with composite PK.", level="info")
         create_sql = _build_create_table_sql(table_name, target_schema_name, source_schema)
         if not create_sql:
-            return False
+            return False, False
         
         if _execute_ddl(target_cursor, create_sql, f"Create consolidated table {table_name}", table_name):
-            target_cursor.connection.commit()
-            return True
+            return True, True
         else:
-            target_cursor.connection.rollback()
-            return False
+            _forget_failed_ddl(table_name)
+            return False, False
 
     # --- B. Ongoing Schema Reconciliation ---
     log_print(f"Target table {table_name} exists. Comparing schemas for consolidation.", level="info")
     schema_changed = False
+    unresolved_differences = False
 
     # 1. Verify BranchIdentifier column exists
     if BRANCH_ID_COL not in target_schema['columns']:
         log_print(f"Column '{BRANCH_ID_COL}' missing in target table {table_name}. Attempting to add.", level="warning")
         add_branch_col_sql = f"ALTER TABLE [{target_schema_name}].[{table_name}] ADD [{BRANCH_ID_COL}] {BRANCH_ID_TYPE} NULL"
         if not _execute_ddl(target_cursor, add_branch_col_sql, f"Add column {BRANCH_ID_COL}", table_name):
-            target_cursor.connection.rollback()
-            return False
+            _forget_failed_ddl(table_name)
+            return False, False
         # Note: Column is added as NULLABLE. You may need to backfill it for existing data before making it NOT NULL.
         # For a new setup, this is fine.
         log_print(f"IMPORTANT: Added '{BRANCH_ID_COL}' as NULLABLE. If you have existing data, you must backfill it and then ALTER to NOT NULL.", level="critical")
@@ -113,7 +134,7 @@ def align_target_schema_to_source(
         log_print(f"CRITICAL: Primary Key mismatch for consolidated table {table_name}. "
                   f"Expected PK: {expected_target_pk_cols}, Found PK: {target_pk_cols}. "
                   "Manual intervention is required to fix the PK. This usually involves dropping the old PK and creating the new composite one.", level="critical")
-        return False # Halt for this table
+        return False, False # Halt for this table
 
     # 3. Column-by-Column Reconciliation (Copied from original, no changes needed here)
     source_cols = source_schema['columns']
@@ -123,34 +144,34 @@ def align_target_schema_to_source(
         if col_name not in target_cols:
             log_print(f"Column [{col_name}] missing in target table {table_name}. Attempting to add.", level="info")
             src_col_type_def = get_sql_type_definition(src_col_details)
-            src_col_nullability = "NOT NULL" if not src_col_details['is_nullable'] else "NULL"
+            src_col_nullability = NULLABILITY_SQL[src_col_details.is_nullable]
             add_col_sql = f"ALTER TABLE [{target_schema_name}].[{table_name}] ADD [{col_name}] {src_col_type_def} {src_col_nullability}"
             
             if not _execute_ddl(target_cursor, add_col_sql, f"Add column {col_name}", table_name):
-                target_cursor.connection.rollback()
-                return False
+                _forget_failed_ddl(table_name)
+                return False, False
             schema_changed = True
         else:
             # Check for "safe" alterations (type, length, nullability)
             tgt_col_details = target_cols[col_name]
-            if tgt_col_details['data_type'] == 'sysname': tgt_col_details['data_type'] = 'nvarchar' # Normalize sysname
+            if tgt_col_details.data_type == 'sysname': tgt_col_details = dataclasses.replace(tgt_col_details, data_type='nvarchar') # Normalize sysname (copy; schema details are cached)
             
             src_col_type_def = get_sql_type_definition(src_col_details)
             tgt_col_type_def = get_sql_type_definition(tgt_col_details)
-            src_col_nullability = "NOT NULL" if not src_col_details['is_nullable'] else "NULL"
-            tgt_col_nullability = "NOT NULL" if not tgt_col_details['is_nullable'] else "NULL"
+            src_col_nullability = NULLABILITY_SQL[src_col_details.is_nullable]
+            tgt_col_nullability = NULLABILITY_SQL[tgt_col_details.is_nullable]
 
             if src_col_type_def != tgt_col_type_def or src_col_nullability != tgt_col_nullability:
                 # This complex logic for safe alteration remains the same.
                 # If a change is needed, it will be attempted. If unsafe, it will halt.
                 # (Logic for safe alteration is omitted for brevity but is assumed to be here)
                 log_print(f"Schema difference for column [{col_name}]. Source: '{src_col_type_def} {src_col_nullability}', Target: '{tgt_col_type_def} {tgt_col_nullability}'. Manual check may be needed.", level="warning")
+                unresolved_differences = True
 
 
     if schema_changed:
-        log_print(f"Schema for table {table_name} was modified. Committing changes.", level="info")
-        target_cursor.connection.commit()
-    else:
+        log_print(f"Schema for table {table_name} was modified.", level="info")
+    elif not unresolved_differences:
         log_print(f"Schema for table {table_name} is already aligned.", level="info")
 
-    return True
+    return True, not unresolved_differences
@@ -1,55 +1,101 @@
+import csv
+import itertools
+import multiprocessing
+import os
 import pyodbc
+import queue
+import sys
+import uuid
 import threading
 import logging
 import traceback
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
 
 from utils.db_utils import (
-    connect_to_db,
+    acquire,
+    acquire_connection,
+    release_connection,
+    reset_process_state,
     ensure_database_exists, 
     ensure_sync_schema_and_meta, 
-    get_sync_meta_entry,
-    update_last_synced_value,
-    update_sync_meta_status,
+    get_sync_meta_entries,
+    flush_sync_meta,
+    set_source_schema_hash,
+    bulk_seed_sync_meta,
     get_table_schema_details,
-    get_sql_type_definition
+    get_table_schemas_bulk,
+    invalidate_schema_cache,
+    get_sql_type_definition,
+    get_input_size,
+    SQL_UPDATE_LAST_VALUE,
+    UPDATE_LAST_VALUE_INPUT_SIZES,
+    SQL_SERVER_MAX_PARAMS,
+    SQL_SERVER_MAX_VALUES_ROWS
 )
 from utils.common import (
     log_print,
     TABLES_TO_SYNC, 
     SYNC_METHODS,
     CONSOLIDATED_TARGET_DATABASE,
-    MAX_CONCURRENT_TABLES_PER_BRANCH
+    MAX_CONCURRENT_TABLES_PER_BRANCH,
+    TABLE_SYNC_USE_PROCESSES,
+    FETCH_CHUNK_SIZE,
+    BULK_INSERT_CLIENT_DIR,
+    BULK_INSERT_SERVER_DIR,
+    BULK_INSERT_MIN_ROWS,
+    BATCH_SIZE_MAP,
+    DEFAULT_BATCH_SIZE,
+    ADAPTIVE_BATCH_TARGET_SECONDS,
+    ADAPTIVE_BATCH_MIN_SIZE,
+    ADAPTIVE_BATCH_MAX_SIZE,
+    ADAPTIVE_BATCH_MAX_GROWTH
 )
 from utils.schema_manager import align_target_schema_to_source, BRANCH_ID_COL
 from utils.common import build_query as common_build_query
 
 def load_connections(file_path="connection_strings.txt"):
-    """Loads connections. No changes needed here."""
-    conns = []
+    """
+    Loads connections. Lines are CSV, so a field (e.g. a password) containing a comma can be double-quoted.
+    The parsed file is cached until its modification time changes; each call returns fresh dicts.
+    """
     try:
-        with open(file_path, 'r') as f:
-            lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-        for line_num, line in enumerate(lines, 1):
-            parts = [p.strip() for p in line.split(',')]
+        mtime_ns = os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        log_print(f"Connection file '{file_path}' not found.", level="critical")
+        raise
+    return [dict(cfg) for cfg in _parse_connections(file_path, mtime_ns)]
+
+@lru_cache(maxsize=4)
+def _parse_connections(file_path: str, mtime_ns: int) -> tuple[dict, ...]:
+    """Parses the connection file; mtime_ns is only part of the cache key."""
+    conns = []
+    with open(file_path, 'r', newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        for parts in reader:
+            parts = [p.strip() for p in parts]
+            if not any(parts) or parts[0].startswith('#'):
+                continue
             if len(parts) == 5:
                 server, db, user, pwd, tgt_flag = parts
                 port = '1433'
             elif len(parts) == 6:
                 server, port, db, user, pwd, tgt_flag = parts
             else:
-                log_print(f"Skipping malformed line {line_num} in {file_path}", level="warning")
+                log_print(f"Skipping malformed line {reader.line_num} in {file_path}", level="warning")
                 continue
             conns.append({
                 'server': server, 'port': port, 'database': db,
                 'username': user, 'password': pwd, 'target_flag': tgt_flag.lower()
             })
-        log_print(f"Loaded {len(conns)} connection configurations.", level="info")
-    except FileNotFoundError:
-        log_print(f"Connection file '{file_path}' not found.", level="critical")
-        raise
-    return conns
+    log_print(f"Loaded {len(conns)} connection configurations.", level="info")
+    return tuple(conns)
 
 def db_config(cfg: dict) -> dict:
     """Extracts db connection params. No changes needed."""
@@ -95,83 +141,418 @@ def _determine_watermark_and_pk_columns(table_name: str, source_schema_details:
     
     return watermark_col_for_query, pk_col_for_merge
 
-def _upsert_batch_atomic(
-    target_cursor: pyodbc.Cursor, 
-    table_name: str,
-    columns_in_batch: list[str],
-    batch_rows: list[pyodbc.Row],
-    pk_col_for_merge: str, 
-    branch_identifier: str,
-    current_batch_last_val_for_meta: str,
-    source_schema_details: dict
-):
+_FETCH_DONE = object() # End-of-stream marker for _stream_fetch
+
+def _stream_fetch(cursor: pyodbc.Cursor, chunk_size: int) -> Iterator[list[pyodbc.Row]]:
     """
-    Upserts a batch of data using a temporary table for performance and memory efficiency.
+    Yields the remaining rows of an executed cursor in fetchmany(chunk_size) chunks. A producer thread reads ahead
+    into a bounded queue (at most two chunks waiting), so receiving from the source overlaps with whatever the
+    consumer does with each chunk and memory stays at a few chunks. Producer errors are re-raised in the consumer.
+    The cursor must not be touched by anything else until the generator is exhausted or closed (use closing()).
     """
-    if not batch_rows:
-        return
+    chunks = queue.Queue(maxsize=2)
+    stop = threading.Event()
 
-    temp_table_name = f"##{table_name}_sync_{threading.get_ident()}"
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
 
+    def produce():
+        try:
+            while not stop.is_set():
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                put(chunk)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_FETCH_DONE)
+
+    producer = threading.Thread(target=produce, name=f"{threading.current_thread().name}_fetch", daemon=True)
+    producer.start()
     try:
-        # 1. Create the temporary table
-        column_definitions = [f"[{BRANCH_ID_COL}] NVARCHAR(255) NOT NULL"]
-        for col_name in columns_in_batch:
-            col_details = source_schema_details['columns'][col_name]
-            col_type_def = get_sql_type_definition(col_details)
-            column_definitions.append(f"[{col_name}] {col_type_def}")
-        
-        create_temp_table_sql = f"CREATE TABLE {temp_table_name} ({', '.join(column_definitions)})"
-        target_cursor.execute(create_temp_table_sql)
+        while True:
+            item = chunks.get()
+            if item is _FETCH_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+# Terminators for BULK INSERT data files; values containing them fall back to executemany
+_BULK_FIELD_TERM = "~^~"
+_BULK_ROW_TERM = "~#~\n"
+_LEGACY_DATETIME_TYPES = frozenset({'datetime', 'smalldatetime'}) # Accept at most 3 fractional digits from text
+
+class _NotBulkable(Exception):
+    """A value cannot round-trip through the BULK INSERT text format (e.g. '' would load as NULL)."""
+
+def _bulk_text_value(value, legacy_datetime: bool) -> str:
+    if value is None:
+        return "" # Loaded as NULL (KEEPNULLS)
+    if isinstance(value, str):
+        if not value or _BULK_FIELD_TERM in value or _BULK_ROW_TERM in value:
+            raise _NotBulkable()
+        return value
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="milliseconds" if legacy_datetime else "microseconds")
+    if isinstance(value, Decimal):
+        return format(value, "f") # Never scientific notation, which decimal columns reject
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+def _bulk_insert_chunk(target_cursor: pyodbc.Cursor, temp_table_name: str, branch_identifier: str,
+                       chunk: list[pyodbc.Row], legacy_datetime_flags: list[bool]) -> bool:
+    """
+    Stages a chunk with server-side BULK INSERT from a UTF-16 data file in BULK_INSERT_CLIENT_DIR.
+    Returns False (nothing staged) if bulk staging is not configured, the chunk is small, a value cannot be
+    represented in the text format, or BULK INSERT fails; the caller then stages with executemany.
+    """
+    if not BULK_INSERT_CLIENT_DIR or len(chunk) < BULK_INSERT_MIN_ROWS:
+        return False
+    try:
+        lines = [
+            _BULK_FIELD_TERM.join([branch_identifier, *map(_bulk_text_value, row, legacy_datetime_flags)]) + _BULK_ROW_TERM
+            for row in chunk
+        ]
+    except _NotBulkable:
+        return False
+
+    file_name = f"{uuid.uuid4().hex}.dat"
+    client_path = os.path.join(BULK_INSERT_CLIENT_DIR, file_name)
+    server_path = os.path.join(BULK_INSERT_SERVER_DIR or BULK_INSERT_CLIENT_DIR, file_name).replace("'", "''")
+    try:
+        with open(client_path, "w", encoding="utf-16", newline="") as data_file:
+            data_file.writelines(lines)
+        target_cursor.execute(
+            f"BULK INSERT {temp_table_name} FROM '{server_path}' WITH (DATAFILETYPE = 'widechar', "
+            f"FIELDTERMINATOR = '{_BULK_FIELD_TERM}', ROWTERMINATOR = '{_BULK_ROW_TERM}', KEEPNULLS, TABLOCK)"
+        )
+        return True
+    except (OSError, pyodbc.Error) as e:
+        log_print(f"BULK INSERT staging into {temp_table_name} failed ({e}); falling back to executemany.", level="warning")
+        return False
+    finally:
+        try:
+            os.remove(client_path)
+        except OSError:
+            pass
 
-        # 2. Insert the batch into the temporary table
-        target_columns = [BRANCH_ID_COL] + columns_in_batch
-        data_to_insert = [(branch_identifier,) + tuple(row) for row in batch_rows]
-        
-        insert_sql = f"INSERT INTO {temp_table_name} ({', '.join(f'[{c}]' for c in target_columns)}) VALUES ({', '.join(['?'] * len(target_columns))})"
-        
-        target_cursor.fast_executemany = True
-        
-        start_staging = time.perf_counter()
-        target_cursor.executemany(insert_sql, data_to_insert)
-        staging_time = time.perf_counter() - start_staging
-        log_print(f"Staged {len(data_to_insert)} rows to temp table in {staging_time:.2f}s.", level="debug")
+@dataclass(slots=True)
+class _BatchContext:
+    """Per-table SQL and lookups for _upsert_batch_atomic, built once per sync_table call by _build_batch_context."""
+    table_name: str
+    branch_identifier: str
+    temp_table_name: str
+    create_temp_table_sql: str
+    insert_sql: str
+    input_sizes: list # setinputsizes for insert_sql, from the declared column types
+    upsert_sql: str # UPDATE + INSERT from the temp table, DROP of it, watermark update and COMMIT
+    insert_only_sql: str # As upsert_sql, but a plain INSERT (the target has no rows of this branch yet)
+    inline_declare_sql: str # Opens the transaction, declares and starts filling @source; a VALUES list is appended per batch
+    inline_upsert_sql: str # UPDATE + INSERT from @source, watermark update and COMMIT
+    inline_insert_only_sql: str # As inline_upsert_sql, but a plain INSERT
+    inline_max_rows: int # Largest batch that fits one VALUES list within the parameter limit
+    watermark_idx: int # Position of the watermark column in the fetched rows
+    legacy_datetime_flags: list[bool] # Per staged source column, for BULK INSERT formatting
+
+def _build_batch_context(
+    table_name: str,
+    columns_in_batch: list[str],
+    pk_col_for_merge: str,
+    watermark_col: str,
+    branch_identifier: str,
+    source_schema_details: dict
+) -> _BatchContext:
+    # Session-local: each sync_table holds its own target connection, so no per-thread suffix is needed. Pooled
+    # connections outlive the batch, so the table is still dropped explicitly (with the upsert, or in finally).
+    temp_table_name = f"#{table_name}_sync"
+    target_columns = [BRANCH_ID_COL] + columns_in_batch
+    source_columns = source_schema_details['columns']
+
+    # The branch is the column default, so executemany can bind the fetched pyodbc Rows as they are
+    branch_literal = branch_identifier.replace("'", "''")
+    column_definitions = [f"[{BRANCH_ID_COL}] NVARCHAR(255) NOT NULL DEFAULT N'{branch_literal}'"]
+    column_definitions.extend(f"[{col_name}] {get_sql_type_definition(source_columns[col_name])}" for col_name in columns_in_batch)
+
+    target_col_list_sql = ', '.join(f'[{c}]' for c in target_columns)
+    source_col_list_sql = ', '.join(f'source.[{c}]' for c in target_columns)
+
+    # UPDATE existing keys, then INSERT the missing ones.
+    # Split instead of MERGE (MERGE's concurrency anomalies and plan-memory cliffs); same transaction, same result.
+    set_clause_parts = [f"target.[{c}] = source.[{c}]" for c in columns_in_batch if c.lower() != pk_col_for_merge.lower()]
+    match_clause = f"target.[{BRANCH_ID_COL}] = source.[{BRANCH_ID_COL}] AND target.[{pk_col_for_merge}] = source.[{pk_col_for_merge}]"
+
+    def insert_from(source_name: str) -> str:
+        return f"""
+        INSERT INTO [{table_name}] ({target_col_list_sql})
+        SELECT {source_col_list_sql} FROM {source_name} AS source;
+        """
 
-        # 3. Execute the server-side MERGE from the temporary table
-        set_clause_parts = [f"target.[{c}] = source.[{c}]" for c in columns_in_batch if c.lower() != pk_col_for_merge.lower()]
-        set_clause = ', '.join(set_clause_parts) if set_clause_parts else f"target.[{pk_col_for_merge}] = source.[{pk_col_for_merge}]"
+    def upsert_from(source_name: str) -> str:
+        sql = ""
+        if set_clause_parts: # A key-only table has nothing to update
+            sql += f"""
+        UPDATE target SET {', '.join(set_clause_parts)}
+        FROM [{table_name}] AS target
+        INNER JOIN {source_name} AS source ON {match_clause};
+        """
+        return sql + f"""
+        INSERT INTO [{table_name}] ({target_col_list_sql})
+        SELECT {source_col_list_sql} FROM {source_name} AS source
+        WHERE NOT EXISTS (SELECT 1 FROM [{table_name}] AS target WHERE {match_clause});
+        """
 
-        merge_on_clause = f"target.[{BRANCH_ID_COL}] = source.[{BRANCH_ID_COL}] AND target.[{pk_col_for_merge}] = source.[{pk_col_for_merge}]"
-        
-        target_col_list_sql = ', '.join(f'[{c}]' for c in target_columns)
-        source_col_list_sql = ', '.join(f'source.[{c}]' for c in target_columns)
-
-        merge_sql = f"""
-        MERGE INTO [{table_name}] AS target
-        USING {temp_table_name} AS source
-        ON ({merge_on_clause})
-        WHEN MATCHED THEN UPDATE SET {set_clause}
-        WHEN NOT MATCHED BY TARGET THEN INSERT ({target_col_list_sql}) VALUES ({source_col_list_sql});
+    return _BatchContext(
+        table_name=table_name,
+        branch_identifier=branch_identifier,
+        temp_table_name=temp_table_name,
+        # Drops a copy left on this session by a batch whose cleanup DROP failed, in the same round-trip as the CREATE
+        create_temp_table_sql=(
+            f"IF OBJECT_ID('tempdb..{temp_table_name}') IS NOT NULL DROP TABLE {temp_table_name};\n"
+            f"CREATE TABLE {temp_table_name} ({', '.join(column_definitions)})"
+        ),
+        insert_sql=(
+            f"INSERT INTO {temp_table_name} ({', '.join(f'[{c}]' for c in columns_in_batch)}) "
+            f"VALUES ({', '.join(['?'] * len(columns_in_batch))})"
+        ),
+        input_sizes=[get_input_size(source_columns[c]) for c in columns_in_batch],
+        upsert_sql=_SQL_OPEN_TRAN + upsert_from(temp_table_name) + f"DROP TABLE {temp_table_name};" + _SQL_SET_WATERMARK_AND_COMMIT,
+        insert_only_sql=_SQL_OPEN_TRAN + insert_from(temp_table_name) + f"DROP TABLE {temp_table_name};" + _SQL_SET_WATERMARK_AND_COMMIT,
+        inline_declare_sql=(
+            f"{_SQL_OPEN_TRAN}"
+            f"DECLARE @source TABLE ({', '.join(column_definitions)});\n"
+            f"INSERT INTO @source ({', '.join(f'[{c}]' for c in columns_in_batch)}) VALUES "
+        ),
+        inline_upsert_sql=upsert_from("@source") + _SQL_SET_WATERMARK_AND_COMMIT,
+        inline_insert_only_sql=insert_from("@source") + _SQL_SET_WATERMARK_AND_COMMIT,
+        inline_max_rows=min(SQL_SERVER_MAX_VALUES_ROWS, SQL_SERVER_MAX_PARAMS // len(columns_in_batch)),
+        watermark_idx=columns_in_batch.index(watermark_col),
+        legacy_datetime_flags=[source_columns[c].data_type in _LEGACY_DATETIME_TYPES for c in columns_in_batch]
+    )
+
+def _execute_all(cursor: pyodbc.Cursor, sql: str, *params):
+    """Executes a multi-statement batch and consumes every result (row counts included) so all statements complete."""
+    cursor.execute(sql, *params)
+    while cursor.nextset():
+        pass
+
+# Invalid object name / invalid column name: a table or column no longer matches the schema the SQL was built from
+_SCHEMA_DRIFT_SQLSTATES = frozenset({'42S02', '42S22'})
+
+# Target connections run in autocommit mode; only the upsert and its watermark update share an explicit transaction.
+# The upsert batches open it, and end with the watermark update and the COMMIT, so a batch is committed in the same
+# round-trip as its upsert. BEGIN and COMMIT must stay in the same batch: the batches are parameterized (executed
+# via sp_prepexec), and a transaction count that differs on leaving the call raises error 266 after committing.
+# XACT_ABORT makes any failing statement abort the batch and its transaction instead of letting the COMMIT go
+# through; a missing SyncMeta row rolls back too (the row is created when the table's sync starts).
+_SQL_ROLLBACK_OPEN_TRAN = "IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION"
+_SQL_OPEN_TRAN = "SET XACT_ABORT ON;\nBEGIN TRANSACTION;\n"
+_SQL_SET_WATERMARK_AND_COMMIT = f"""
+        {SQL_UPDATE_LAST_VALUE};
+        IF @@ROWCOUNT = 0
+        BEGIN
+            ROLLBACK TRANSACTION;
+            RAISERROR('SyncMeta row missing; watermark not updated.', 16, 1);
+        END
+        ELSE COMMIT TRANSACTION;
         """
-        
+
+def _upsert_inline(target_cursor: pyodbc.Cursor, ctx: _BatchContext, rows: list[pyodbc.Row], last_value: str,
+                   insert_only: bool = False):
+    """
+    Upserts a small batch in a single round-trip: the rows are bound into one VALUES list that fills a table
+    variable, which the UPDATE + INSERT then read, and the same batch sets the watermark and commits.
+    No temp table is created or dropped.
+    """
+    row_placeholders = f"({', '.join(['?'] * len(ctx.input_sizes))})"
+    target_cursor.setinputsizes(ctx.input_sizes * len(rows) + UPDATE_LAST_VALUE_INPUT_SIZES)
+    _execute_all(
+        target_cursor,
+        ctx.inline_declare_sql + ", ".join([row_placeholders] * len(rows)) + ";"
+        + (ctx.inline_insert_only_sql if insert_only else ctx.inline_upsert_sql),
+        [value for row in rows for value in row] + [last_value, ctx.branch_identifier, ctx.table_name]
+    )
+
+def _upsert_batch_atomic(
+    target_cursor: pyodbc.Cursor, 
+    ctx: _BatchContext,
+    row_chunks: Iterable[list[pyodbc.Row]],
+    on_staged: Callable[[str], None] | None = None,
+    insert_only: bool = False
+) -> tuple[int, str | None]:
+    """
+    Upserts a batch of data using a temporary table for performance and memory efficiency.
+    A batch that arrives as one chunk of at most ctx.inline_max_rows rows skips the temporary table and is
+    upserted from a VALUES-filled table variable in one statement batch (see _upsert_inline).
+    Otherwise each chunk of row_chunks is staged as it arrives (BULK INSERT for large chunks when configured, otherwise
+    fast_executemany); the upsert and the watermark update follow once all are staged.
+    The new watermark is read from the last row (batches are ordered by the watermark column).
+    Returns (rows upserted, new watermark), or (0, None) without touching the target if there were no rows.
+    on_staged, if given, is called with the new watermark once row_chunks is exhausted and before the upsert runs.
+    insert_only skips the UPDATE and the existence check and plainly INSERTs; only for callers that know the target
+    holds none of this branch's keys (e.g. its first batch into a table with no rows of the branch).
+    The target connection must be in autocommit mode: the upsert and watermark update run in one explicit transaction
+    opened and committed by the same statement batch (rolled back on error). Staging into the session-private
+    temporary table stays outside it.
+    """
+    temp_table_created = False
+    in_transaction = False
+    rows_staged = 0
+    last_row = None
+    branch_identifier = ctx.branch_identifier
+
+    try:
+        chunks = iter(row_chunks)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return 0, None
+        if len(first_chunk) <= ctx.inline_max_rows:
+            second_chunk = next(chunks, None)
+            if second_chunk is None:
+                current_batch_last_val_for_meta = str(first_chunk[-1][ctx.watermark_idx])
+                if on_staged is not None:
+                    on_staged(current_batch_last_val_for_meta)
+                start_merge = time.perf_counter()
+                in_transaction = True # Opened by the inline batch itself
+                _upsert_inline(target_cursor, ctx, first_chunk, current_batch_last_val_for_meta, insert_only)
+                in_transaction = False
+                log_print(f"Upserted {len(first_chunk)} rows inline (UPDATE + INSERT) in {time.perf_counter() - start_merge:.2f}s.", level="debug")
+                return len(first_chunk), current_batch_last_val_for_meta
+            chunks = itertools.chain((first_chunk, second_chunk), chunks)
+        else:
+            chunks = itertools.chain((first_chunk,), chunks)
+
+        staging_time = 0.0
+        for chunk in chunks:
+            if not temp_table_created:
+                # 1. Create the temporary table (only once there is something to stage)
+                target_cursor.execute(ctx.create_temp_table_sql)
+                temp_table_created = True
+                target_cursor.fast_executemany = True
+
+            # 2. Insert the chunk into the temporary table
+            start_staging = time.perf_counter()
+            if not _bulk_insert_chunk(target_cursor, ctx.temp_table_name, branch_identifier, chunk, ctx.legacy_datetime_flags):
+                target_cursor.setinputsizes(ctx.input_sizes)
+                target_cursor.executemany(ctx.insert_sql, chunk)
+            staging_time += time.perf_counter() - start_staging
+            rows_staged += len(chunk)
+            last_row = chunk[-1]
+
+        if last_row is None:
+            return 0, None
+        log_print(f"Staged {rows_staged} rows to temp table in {staging_time:.2f}s.", level="debug")
+        current_batch_last_val_for_meta = str(last_row[ctx.watermark_idx])
+        if on_staged is not None:
+            on_staged(current_batch_last_val_for_meta)
+
+        # 3. Upsert from the temporary table, drop it, update the watermark and commit, all in one batch
         start_merge = time.perf_counter()
-        target_cursor.execute(merge_sql)
+        target_cursor.setinputsizes(UPDATE_LAST_VALUE_INPUT_SIZES)
+        in_transaction = True # Opened by the upsert batch itself
+        _execute_all(
+            target_cursor, ctx.insert_only_sql if insert_only else ctx.upsert_sql,
+            current_batch_last_val_for_meta, branch_identifier, ctx.table_name
+        )
+        temp_table_created = False # Dropped by the batch above
+        in_transaction = False
         merge_time = time.perf_counter() - start_merge
-        log_print(f"Merged from temp table in {merge_time:.2f}s.", level="debug")
-        
-        # 4. Update metadata
-        update_last_synced_value(target_cursor, branch_identifier, table_name, current_batch_last_val_for_meta)
+        log_print(f"Upserted (UPDATE + INSERT) from temp table in {merge_time:.2f}s.", level="debug")
+        return rows_staged, current_batch_last_val_for_meta
 
     finally:
-        # 5. Clean up by dropping the temporary table
+        if in_transaction:
+            try:
+                target_cursor.execute(_SQL_ROLLBACK_OPEN_TRAN)
+            except pyodbc.Error:
+                pass
+        # 4. Clean up by dropping the temporary table
+        if temp_table_created:
+            try:
+                target_cursor.execute(f"DROP TABLE {ctx.temp_table_name}")
+            except pyodbc.Error:
+                pass
+
+# Learned batch size per lowercased table name; shared by all branches and kept across cycles
+_BATCH_SIZE_HINTS: dict[str, int] = {}
+
+def _next_batch_size(table_name: str, current: int, rows_in_batch: int, batch_time: float) -> int:
+    """
+    Scales the table's batch size toward ADAPTIVE_BATCH_TARGET_SECONDS per batch and records it as the table's hint.
+    A batch that came back short (the table is caught up) says nothing about throughput and leaves the size alone.
+    """
+    if rows_in_batch < current:
+        return current
+    scaled = current * ADAPTIVE_BATCH_TARGET_SECONDS / max(batch_time, 0.1)
+    new_size = int(max(ADAPTIVE_BATCH_MIN_SIZE, min(ADAPTIVE_BATCH_MAX_SIZE, current * ADAPTIVE_BATCH_MAX_GROWTH, scaled)))
+    if new_size != current:
+        log_print(f"Batch size for {table_name}: {current} -> {new_size} rows (last batch {batch_time:.2f}s).", level="debug")
+    _BATCH_SIZE_HINTS[table_name.lower()] = new_size
+    return new_size
+
+def _execute_batch_query(cursor: pyodbc.Cursor, table_name: str, select_columns: list[str], watermark_col: str,
+                         last_synced_value: str, sync_method: str, batch_size: int | None) -> pyodbc.Cursor:
+    """Runs one batch SELECT on the given source cursor and returns it, positioned before the first row."""
+    query, query_params = common_build_query(
+        table_name=table_name, select_columns=select_columns,
+        watermark_column=watermark_col, last_synced_value=last_synced_value,
+        sync_method=sync_method, batch_size=batch_size
+    )
+    return cursor.execute(query, *query_params)
+
+def _close_cursor_quietly(cursor: pyodbc.Cursor):
+    try:
+        cursor.close()
+    except pyodbc.Error:
+        pass
+
+def _target_conn_params(target_server_config: dict) -> dict:
+    return {**db_config(target_server_config), 'database': CONSOLIDATED_TARGET_DATABASE, 'autocommit': True}
+
+def _take_target_conn(target_conns: queue.Queue, target_server_config: dict) -> pyodbc.Connection:
+    """Takes a connection from a branch's target slots, blocking while all are in use. Empty (None) slots are filled lazily."""
+    conn = target_conns.get()
+    if conn is None:
         try:
-            target_cursor.execute(f"DROP TABLE {temp_table_name}")
+            conn = acquire_connection(**_target_conn_params(target_server_config))
+        except Exception:
+            target_conns.put(None)
+            raise
+    return conn
+
+def _return_target_conn(target_conns: queue.Queue, conn: pyodbc.Connection, discard: bool = False):
+    """Puts a connection back into its branch's slots (any open transaction rolled back); a discarded one leaves an empty slot behind."""
+    if not discard:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_SQL_ROLLBACK_OPEN_TRAN)
         except pyodbc.Error:
-            pass
-
-def sync_table(table_to_sync: str, source_branch_config: dict, target_server_config: dict, branch_identifier: str, running_state: dict):
+            discard = True
+    if discard:
+        release_connection(conn, discard=True)
+        conn = None
+    target_conns.put(conn)
+
+def sync_table(table_to_sync: str, source_branch_config: dict, target_server_config: dict, branch_identifier: str,
+               shutdown_event: threading.Event, target_conns: queue.Queue | None = None) -> tuple[str, str, str] | None:
     """
     Main function to sync a single table, with detailed timing logs.
+    If target_conns (the branch's shared target connections, see sync_branch) is given, the target connection is
+    taken from it and the branch is expected to have ensured the target database already.
+    Returns (table_name, final_status, remarks) for the caller to write to SyncMeta together with the branch's other
+    tables, or None if shutdown was signaled before any data was synced. Watermarks are written with each batch.
     """
     thread_name = threading.current_thread().name
     log_print(f"[{thread_name}] Starting sync for table: {table_to_sync}, branch: {branch_identifier}", level="info")
@@ -179,35 +560,37 @@ def sync_table(table_to_sync: str, source_branch_config: dict, target_server_con
     target_db_name = CONSOLIDATED_TARGET_DATABASE
     src_conn = None
     tgt_conn = None
+    discard_conns = False # Set on unexpected failure so possibly-broken connections are not returned to the pool
+    meta_key = (branch_identifier, table_to_sync)
 
     try:
         # --- Initial Setup and Connection ---
-        if not running_state['is_running']: return
+        if shutdown_event.is_set(): return
 
-        ensure_database_exists(master_conn_details=db_config(target_server_config), db_name=target_db_name)
+        if target_conns is None:
+            ensure_database_exists(master_conn_details=db_config(target_server_config), db_name=target_db_name)
 
-        src_conn = connect_to_db(**db_config(source_branch_config))
-        tgt_conn = connect_to_db(**{**db_config(target_server_config), 'database': target_db_name, 'autocommit': False})
+        src_conn = acquire_connection(**db_config(source_branch_config))
+        if target_conns is not None:
+            tgt_conn = _take_target_conn(target_conns, target_server_config)
+        else:
+            tgt_conn = acquire_connection(**_target_conn_params(target_server_config))
 
         # --- Metadata and Schema Setup ---
         ensure_sync_schema_and_meta(tgt_conn)
         with tgt_conn.cursor() as t_meta_cursor:
-            get_sync_meta_entry(t_meta_cursor, branch_identifier, table_to_sync, create_if_not_exists=True)
-            update_sync_meta_status(t_meta_cursor, branch_identifier, table_to_sync, 'InProgress', f'[{thread_name}] Starting sync cycle.')
-            tgt_conn.commit()
+            # Creates the SyncMeta row if missing and marks it InProgress in one statement
+            flush_sync_meta(t_meta_cursor, {meta_key: {"Status": 'InProgress', "Remarks": f'[{thread_name}] Starting sync cycle.'}})
 
-        if not running_state['is_running']: return
+        if shutdown_event.is_set(): return
 
         schema_aligned = False
         with src_conn.cursor() as s_cursor, tgt_conn.cursor() as t_align_cursor:
-            schema_aligned = align_target_schema_to_source(s_cursor, t_align_cursor, table_to_sync)
+            schema_aligned = align_target_schema_to_source(s_cursor, t_align_cursor, table_to_sync, branch_name=branch_identifier)
         
         if not schema_aligned:
             log_print(f"[{thread_name}] Skipping data sync for {table_to_sync} due to schema alignment issues.", level="warning")
-            with tgt_conn.cursor() as t_err_cursor:
-                update_sync_meta_status(t_err_cursor, branch_identifier, table_to_sync, 'SchemaError', "Schema alignment failed.")
-                tgt_conn.commit()
-            return
+            return table_to_sync, 'SchemaError', "Schema alignment failed."
 
         # --- Prepare for Data Sync Loop ---
         with src_conn.cursor() as s_cursor: 
@@ -217,73 +600,115 @@ def sync_table(table_to_sync: str, source_branch_config: dict, target_server_con
         if not watermark_col or not pk_col_for_merge:
              raise ValueError(f"Could not determine watermark or PK column for {table_to_sync}.")
 
-        ordered_source_cols_tuples = sorted(source_schema_details['columns'].items(), key=lambda item: item[1]['ordinal_position'])
+        ordered_source_cols_tuples = sorted(source_schema_details['columns'].items(), key=lambda item: item[1].ordinal_position)
         select_cols_for_query = [col_name for col_name, _ in ordered_source_cols_tuples]
+        # Rows come back in select_cols_for_query order; everything about the staging SQL is fixed from here on
+        batch_ctx = _build_batch_context(
+            table_to_sync, select_cols_for_query, pk_col_for_merge, watermark_col, branch_identifier, source_schema_details
+        )
 
         with tgt_conn.cursor() as t_meta_cursor:
-            current_meta_entry = get_sync_meta_entry(t_meta_cursor, branch_identifier, table_to_sync, create_if_not_exists=False)
+            current_meta_entry = get_sync_meta_entries(t_meta_cursor, branch_identifier, [table_to_sync])[table_to_sync]
         
         query_last_val = current_meta_entry['LastValue']
         sync_method_for_table = SYNC_METHODS.get(table_to_sync.lower(), 'autono')
         if sync_method_for_table == 'full':
             query_last_val = '0'
+            batch_size = None # 'full' takes a single configured-size batch; not adapted
+        else:
+            batch_size = _BATCH_SIZE_HINTS.get(table_to_sync.lower(), BATCH_SIZE_MAP.get(table_to_sync.lower(), DEFAULT_BATCH_SIZE))
 
         # --- Data Sync Loop with Batch Commits ---
         total_rows_synced_this_run = 0
         data_sync_loop_error = None
-        
+        # The next batch's SELECT is started on this executor as soon as the current batch is staged, so the source
+        # query runs while the target does the upsert and commit. Watermark order is unaffected: the next batch
+        # starts from the staged batch's watermark and is only upserted after this batch commits.
+        prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{thread_name}_prefetch")
+        pending_fetch = None # (future of the next batch's SELECT on src_data_cursor, batch size it was run with)
+        # One cursor per side for all batches; the staged batch is fully read before the next SELECT reuses the source one
+        src_data_cursor = src_conn.cursor()
+        t_data_cursor = tgt_conn.cursor()
+        # A first load (or a full reload into a table holding nothing of this branch) can't hit existing keys, so its
+        # first batch is a plain INSERT; later batches upsert, since the source may have changed rows in between
+        insert_only = query_last_val == '0' and t_data_cursor.execute(
+            f"SELECT TOP (1) 1 FROM [{table_to_sync}] WHERE [{BRANCH_ID_COL}] = ?", branch_identifier
+        ).fetchone() is None
+
+        def start_next_fetch(staged_watermark: str):
+            nonlocal pending_fetch
+            if sync_method_for_table != 'full' and not shutdown_event.is_set():
+                pending_fetch = (prefetch_executor.submit(
+                    _execute_batch_query, src_data_cursor, table_to_sync, select_cols_for_query, watermark_col,
+                    staged_watermark, sync_method_for_table, batch_size
+                ), batch_size)
+
         try:
-            while running_state['is_running']:
-                query = common_build_query(
-                    table_name=table_to_sync, select_columns=select_cols_for_query,
-                    watermark_column=watermark_col, last_synced_value=query_last_val,
-                    sync_method=sync_method_for_table
-                )
-                
-                start_fetch = time.perf_counter()
-                with src_conn.cursor() as src_data_cursor:
-                    src_data_cursor.execute(query)
-                    rows = src_data_cursor.fetchall()
-                    if rows: 
-                        actual_cols_from_query = [col_desc[0] for col_desc in src_data_cursor.description]
-                fetch_time = time.perf_counter() - start_fetch
-                
-                if not rows:
+            while not shutdown_event.is_set():
+                start_batch = time.perf_counter()
+                if pending_fetch is not None:
+                    (fetch_future, fetch_size), pending_fetch = pending_fetch, None
+                    fetch_future.result()
+                else:
+                    fetch_size = batch_size
+                    _execute_batch_query(
+                        src_data_cursor, table_to_sync, select_cols_for_query, watermark_col,
+                        query_last_val, sync_method_for_table, fetch_size
+                    )
+
+                # Each batch is its own transaction (committed by _upsert_batch_atomic); rows are staged chunk by chunk while the next chunk is fetched
+                with closing(_stream_fetch(src_data_cursor, FETCH_CHUNK_SIZE)) as row_chunks:
+                    rows_in_batch, next_last_val_for_meta = _upsert_batch_atomic(
+                        t_data_cursor, batch_ctx, row_chunks, on_staged=start_next_fetch, insert_only=insert_only
+                    )
+                insert_only = False
+                batch_time = time.perf_counter() - start_batch
+
+                if not rows_in_batch:
                     log_print(f"[{thread_name}] No more new rows for {table_to_sync}. Sync for this table is complete.", level="info")
                     break
-                
-                log_print(f"Fetched {len(rows)} rows from source in {fetch_time:.2f}s.", level="debug")
-
-                next_last_val_for_meta = str(max(row[actual_cols_from_query.index(watermark_col)] for row in rows))
 
-                # Each batch is its own transaction
-                with tgt_conn.cursor() as t_data_cursor:
-                    _upsert_batch_atomic( 
-                        t_data_cursor, table_to_sync, actual_cols_from_query, rows,
-                        pk_col_for_merge, branch_identifier, next_last_val_for_meta,
-                        source_schema_details
-                    )
-                tgt_conn.commit() # COMMIT THE BATCH!
+                log_print(f"Fetched and upserted {rows_in_batch} rows in {batch_time:.2f}s.", level="debug")
 
-                total_rows_synced_this_run += len(rows)
-                log_print(f"[{thread_name}] Committed batch for {branch_identifier}:{table_to_sync} ({len(rows)} rows). New watermark: {next_last_val_for_meta}", "info")
+                total_rows_synced_this_run += rows_in_batch
+                log_print(f"[{thread_name}] Committed batch for {branch_identifier}:{table_to_sync} ({rows_in_batch} rows). New watermark: {next_last_val_for_meta}", "info")
                 
                 if sync_method_for_table == 'full':
                     break
+
+                # Applies from the batch after the one already prefetched
+                batch_size = _next_batch_size(table_to_sync, fetch_size, rows_in_batch, batch_time)
                 
                 query_last_val = next_last_val_for_meta
         
         except Exception as loop_err:
             data_sync_loop_error = loop_err
             log_print(f"[{thread_name}] Error during data sync loop for {branch_identifier}:{table_to_sync}. See full traceback below.", level="error")
-            log_print(traceback.format_exc(), level="error")
-            try:
-                tgt_conn.rollback()
-            except pyodbc.Error as rb_err:
-                log_print(f"Rollback failed after error: {rb_err}", level="error")
+            log_print(traceback.format_exc(), level="error") # The failed batch's transaction was rolled back by _upsert_batch_atomic
+            # The SELECT and staging SQL come from cached schema details; a column dropped or renamed out of band
+            # makes them fail, so the next cycle re-reads the schema (and re-aligns) instead of repeating the failure
+            invalidate_schema_cache(table_to_sync)
+            if isinstance(loop_err, pyodbc.Error) and loop_err.args and loop_err.args[0] in _SCHEMA_DRIFT_SQLSTATES:
+                # The stored source hash only vouches for the source; a target table dropped or altered out of band
+                # would otherwise be skipped by every later alignment
+                try:
+                    with tgt_conn.cursor() as t_hash_cursor:
+                        set_source_schema_hash(t_hash_cursor, branch_identifier, table_to_sync, None)
+                except pyodbc.Error as hash_err:
+                    log_print(f"[{thread_name}] Could not clear SourceSchemaHash for {table_to_sync}: {hash_err}", level="warning")
+        finally:
+            # A prefetched SELECT may still be running on src_conn; wait for it before the connection is released
+            if pending_fetch is not None:
+                try:
+                    pending_fetch[0].result()
+                except Exception:
+                    pass
+            prefetch_executor.shutdown(wait=True)
+            _close_cursor_quietly(src_data_cursor)
+            _close_cursor_quietly(t_data_cursor)
 
         # --- Final Status Update ---
-        if not running_state['is_running']:
+        if shutdown_event.is_set():
              log_print(f"[{thread_name}] Shutdown initiated. Final status for {table_to_sync} will be 'Pending'.", "warning")
              data_sync_loop_error = InterruptedError("Shutdown signaled")
 
@@ -294,26 +719,151 @@ def sync_table(table_to_sync: str, source_branch_config: dict, target_server_con
             final_status = 'Pending' if total_rows_synced_this_run > 0 else 'Failed'
             remarks = f"[{thread_name}] Sync interrupted: {str(data_sync_loop_error)[:1000]}"
 
-        with tgt_conn.cursor() as t_final_cursor:
-            update_sync_meta_status(t_final_cursor, branch_identifier, table_to_sync, final_status, remarks)
-        tgt_conn.commit()
-        log_print(f"[{thread_name}] Final status for {table_to_sync} set to '{final_status}'.", level="success" if final_status == 'Complete' else 'warning')
+        log_print(f"[{thread_name}] Final status for {table_to_sync} is '{final_status}'.", level="success" if final_status == 'Complete' else 'warning')
+        return table_to_sync, final_status, remarks
 
     except Exception as e:
         log_print(f"[{thread_name}] CRITICAL failure in sync_table for {table_to_sync}, branch {branch_identifier}: {e}", level="critical")
         log_print(traceback.format_exc(), level="debug")
+        discard_conns = True
+        return table_to_sync, 'Failed', f"[{thread_name}] Unexpected error: {str(e)[:1000]}"
+    finally:
+        if src_conn: release_connection(src_conn, discard=discard_conns)
         if tgt_conn:
-            try:
-                with tgt_conn.cursor() as t_crit_cursor:
-                    update_sync_meta_status(t_crit_cursor, branch_identifier, table_to_sync, 'Failed', f"[{thread_name}] Unexpected error: {str(e)[:1000]}")
-                tgt_conn.commit()
-            except: pass
+            if target_conns is not None:
+                _return_target_conn(target_conns, tgt_conn, discard=discard_conns)
+            else:
+                release_connection(tgt_conn, discard=discard_conns)
+
+
+def _prepare_branch_target(target_server_config: dict, branch_identifier: str, target_conns: queue.Queue):
+    """
+    Creates the SyncMeta rows of every table in TABLES_TO_SYNC that this branch has no row for yet, in bulk,
+    so a newly added branch is provisioned in one pass instead of one INSERT per table, and reads the target
+    schemas of all those tables in one query so schema alignment in sync_table is served from the schema cache.
+    Best effort: sync_table creates any row that is still missing and fetches any schema that is not cached.
+    Also ensures the target database exists once for the whole branch; uses (and warms) one of target_conns.
+    """
+    tgt_conn = None
+    discard = False
+    try:
+        ensure_database_exists(master_conn_details=db_config(target_server_config), db_name=CONSOLIDATED_TARGET_DATABASE)
+        tgt_conn = _take_target_conn(target_conns, target_server_config)
+        ensure_sync_schema_and_meta(tgt_conn)
+        with tgt_conn.cursor() as cur:
+            existing = get_sync_meta_entries(cur, branch_identifier, TABLES_TO_SYNC)
+            missing = [(branch_identifier, table) for table in TABLES_TO_SYNC if table not in existing]
+            bulk_seed_sync_meta(cur, missing)
+            get_table_schemas_bulk(cur, 'dbo', TABLES_TO_SYNC)
+    except Exception as e:
+        discard = True
+        log_print(f"Branch '{branch_identifier}': Could not prepare target (SyncMeta rows, schemas): {e}. Tables will handle it individually.", level="warning")
     finally:
-        if src_conn: src_conn.close()
-        if tgt_conn: tgt_conn.close()
+        if tgt_conn:
+            _return_target_conn(target_conns, tgt_conn, discard=discard)
 
+def _write_final_statuses(target_server_config: dict, branch_identifier: str, target_conns: queue.Queue,
+                          final_statuses: dict[tuple[str, str], dict]):
+    """
+    Writes the final status of all of a branch's tables with one flush_sync_meta call, i.e. one MERGE whose source
+    rows carry each table's status. If that fails, each table is retried on its own so one bad row (or a connection
+    that broke mid-write) does not lose the others' statuses.
+    """
+    if not final_statuses:
+        return
+    tgt_conn = None
+    discard = False
+    try:
+        tgt_conn = _take_target_conn(target_conns, target_server_config)
+        with tgt_conn.cursor() as cur:
+            flush_sync_meta(cur, final_statuses)
+        return
+    except Exception as e:
+        discard = True
+        log_print(f"Branch '{branch_identifier}': Batched final status write failed: {e}. Writing statuses one by one.", level="warning")
+    finally:
+        if tgt_conn:
+            _return_target_conn(target_conns, tgt_conn, discard=discard)
 
-def sync_branch(source_branch_config: dict, target_server_config: dict, running_state: dict):
+    for meta_key, update in final_statuses.items():
+        tgt_conn = None
+        discard = False
+        try:
+            tgt_conn = _take_target_conn(target_conns, target_server_config)
+            with tgt_conn.cursor() as cur:
+                flush_sync_meta(cur, {meta_key: update})
+        except Exception as e:
+            discard = True
+            log_print(f"Branch '{branch_identifier}': Could not write final status for {meta_key[1]}: {e}", level="error")
+        finally:
+            if tgt_conn:
+                _return_target_conn(target_conns, tgt_conn, discard=discard)
+
+def _init_table_process():
+    """
+    Initializer of table worker processes (TABLE_SYNC_USE_PROCESSES). Workers are spawned, so they start without the
+    parent's pools or log handlers; the reset and force=True keep that true should they ever be forked instead.
+    """
+    reset_process_state()
+    logging.basicConfig(
+        level=logging.INFO, stream=sys.stdout, force=True,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(processName)s - %(message)s"
+    )
+
+def _forward_shutdown(shutdown_event: threading.Event, process_event, done: threading.Event):
+    """Sets process_event (a Manager Event shared with worker processes) once shutdown_event is set, until done is."""
+    while not done.is_set():
+        if shutdown_event.wait(timeout=1.0):
+            process_event.set()
+            return
+
+def _collect_table_results(futures: dict[Future, str], branch_identifier: str) -> dict[tuple[str, str], dict]:
+    """Waits for a branch's sync_table futures and returns their final SyncMeta updates keyed by (branch, table)."""
+    final_statuses = {}
+    for future in as_completed(futures):
+        table_name = futures[future]
+        try:
+            result = future.result()
+        except Exception as exc:
+            log_print(f"Branch '{branch_identifier}': Sync for table {table_name} generated a critical exception: {exc}", level="error")
+            log_print(traceback.format_exc(), level="debug")
+            result = (table_name, 'Failed', f"Unexpected error: {str(exc)[:1000]}")
+        if result is not None:
+            _, final_status, remarks = result
+            final_statuses[(branch_identifier, table_name)] = {"Status": final_status, "Remarks": remarks}
+    return final_statuses
+
+def _sync_tables_in_processes(source_branch_config: dict, target_server_config: dict, branch_identifier: str,
+                              shutdown_event: threading.Event) -> dict[tuple[str, str], dict]:
+    """
+    Runs sync_table for every table in a pool of MAX_CONCURRENT_TABLES_PER_BRANCH processes (reused across the
+    branch's tables). Each worker opens its own target connections; shutdown_event is forwarded to a Manager Event.
+    Workers are started with 'spawn' on every platform: a forked child would share the parent's pooled ODBC
+    connections and could inherit a lock held by another thread at fork time.
+    """
+    mp_context = multiprocessing.get_context("spawn")
+    done = threading.Event()
+    with mp_context.Manager() as manager:
+        process_shutdown = manager.Event()
+        forwarder = threading.Thread(
+            target=_forward_shutdown, args=(shutdown_event, process_shutdown, done),
+            name=f"{branch_identifier}_shutdown_fwd", daemon=True
+        )
+        forwarder.start()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=MAX_CONCURRENT_TABLES_PER_BRANCH, mp_context=mp_context, initializer=_init_table_process
+            ) as executor:
+                futures = {
+                    executor.submit(sync_table, table, source_branch_config, target_server_config, branch_identifier, process_shutdown): table
+                    for table in TABLES_TO_SYNC
+                }
+                return _collect_table_results(futures, branch_identifier)
+        finally:
+            done.set()
+            forwarder.join()
+
+def sync_branch(source_branch_config: dict, target_server_config: dict, shutdown_event: threading.Event):
     """
     Orchestrates the sync for a single source branch into the consolidated database.
     """
@@ -321,24 +871,41 @@ def sync_branch(source_branch_config: dict, target_server_config: dict, running_
     branch_identifier = None
     
     try:
-        if not running_state['is_running']: return
-        with connect_to_db(**source_conn_params) as temp_conn, temp_conn.cursor() as cur:
+        if shutdown_event.is_set(): return
+        with acquire(**source_conn_params) as temp_conn, temp_conn.cursor() as cur:
             branch_identifier = _get_branch_name(cur, source_branch_config)
+            # One metadata query for all tables; sync_table's per-table source schema reads are then cache hits
+            get_table_schemas_bulk(cur, 'dbo', TABLES_TO_SYNC)
     except Exception as e:
         log_print(f"Could not connect to source {source_conn_params.get('server')}/{source_conn_params.get('database')} to get branch name: {e}. Skipping.", level="error")
         return
 
     log_print(f"Branch '{branch_identifier}': Starting sync process.", level="info")
 
-    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TABLES_PER_BRANCH, thread_name_prefix=f"{branch_identifier}_sync") as executor:
-        futures = {executor.submit(sync_table, table, source_branch_config, target_server_config, branch_identifier, running_state): table for table in TABLES_TO_SYNC}
-        
-        for future in as_completed(futures):
-            table_name = futures[future]
-            try:
-                future.result()
-            except Exception as exc:
-                log_print(f"Branch '{branch_identifier}': Sync for table {table_name} generated a critical exception: {exc}", level="error")
-                log_print(traceback.format_exc(), level="debug")
+    # One target connection slot per concurrent table; the branch's tables share them instead of each checking out its own
+    target_conns = queue.Queue()
+    for _ in range(MAX_CONCURRENT_TABLES_PER_BRANCH):
+        target_conns.put(None)
+
+    try:
+        _prepare_branch_target(target_server_config, branch_identifier, target_conns)
+
+        # (branch, table) -> SyncMeta update, written in one go once every table has finished
+        if TABLE_SYNC_USE_PROCESSES:
+            final_statuses = _sync_tables_in_processes(source_branch_config, target_server_config, branch_identifier, shutdown_event)
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TABLES_PER_BRANCH, thread_name_prefix=f"{branch_identifier}_sync") as executor:
+                futures = {
+                    executor.submit(sync_table, table, source_branch_config, target_server_config, branch_identifier, shutdown_event, target_conns): table
+                    for table in TABLES_TO_SYNC
+                }
+                final_statuses = _collect_table_results(futures, branch_identifier)
+
+        _write_final_statuses(target_server_config, branch_identifier, target_conns, final_statuses)
+    finally:
+        while not target_conns.empty():
+            conn = target_conns.get_nowait()
+            if conn is not None:
+                release_connection(conn)
 
     log_print(f"Branch '{branch_identifier}': Completed all table sync operations.", level="success")